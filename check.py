@@ -1,9 +1,23 @@
 from __future__ import print_function
 import os
 
+from sad_results_store import get_store_path, export_legacy_csvs
 
 datasets = ['bbs', 'cbc', 'fia', 'gentry', 'mcdb', 'naba']
 
+# Only check the datasets that sad-comparisons.py has fitted
+fitted = []
+for dataset in datasets:
+    if os.path.exists(get_store_path('sad-data/', dataset)):
+        fitted.append(dataset)
+    else:
+        print('skipping %s: no results store' % dataset)
+datasets = fitted
+
+# The checks read the legacy csv views of the results stores
+for dataset in datasets:
+    export_legacy_csvs('sad-data/', dataset)
+
 print('checking outputs:\n')
 
 for dataset in datasets:
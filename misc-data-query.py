@@ -7,6 +7,8 @@ import numpy as np
 import sqlite3 as dbapi
 import re
 
+from sad_db_arrays import fetch_columns, get_schema_dtypes
+
 sys.float_info[2]
 
 # Set up database capabilities 
@@ -21,30 +23,27 @@ con.text_factory = str
 taxa = cur.execute("""SELECT DISTINCT Class FROM miscabundancedb_main
                       WHERE Class IS NOT 'Chondrichthyes' AND Class IS NOT 'Aves' AND Class is NOT ''
                       ORDER BY Class""") #Excludes Chondrichthyes because that class has too few species. (2, for 2 sites), and Aves, because it has no integer abundance data."
-taxa = cur.fetchall()
+taxa = list(fetch_columns(cur).values())[0]
 
 
 communities= cur.execute("""SELECT Class, Site_ID, Citation, (Genus ||" "|| Species) AS species, Abundance FROM
                             miscabundancedb_main
                             WHERE Abundance IS NOT NULL AND Abundance IS NOT 0
                             ORDER BY Site_ID""")
-communities = cur.fetchall()
+communities = list(fetch_columns(cur, get_schema_dtypes(con, 'miscabundancedb_main')).values())
 
 #Close connection
 con.close()
 
-for taxa_class in taxa:
-    taxon_str = str(taxa_class)
-    taxon = re.findall(r"\'([A-Za-z]+)\'", taxon_str) #Strips out just the taxon name
-    #Run through communities, pull out all data that matches the taxon and output as a .csv
+for taxon in taxa:
+    #Pull out all communities that match the taxon and output them as a .csv
+    in_taxon = communities[0] == taxon
     #Output abundances
-    output_file = './sad-data/chapter1/' + taxon[0] + '_spab.csv'
+    output_file = './sad-data/chapter1/' + taxon + '_spab.csv'
     with open(output_file,'wb') as archive_file:
         output_communities = csv.writer(archive_file)
         output_communities.writerow(['site_ID', 'citation', 'species', 'abundance']) #Output header
-        for row in communities:
-            if row[0] == taxon[0]:
-                output_communities.writerow(row[1:])    
+        output_communities.writerows(zip(*[column[in_taxon] for column in communities[1:]]))
     
 print("Complete.")
     
\ No newline at end of file
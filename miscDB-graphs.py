@@ -9,14 +9,16 @@ import re
 import matplotlib.pyplot as plt
 import numpy as np
 
+from sad_db_arrays import fetch_columns
+
 sys.float_info[2]
 
 # Function for bar graphing
 def bar_graph(filename, data, ylabel_name, xlabel_name):
-    N = len(data)
+    """Bar graph of query results with a label column and a count column (see sad_db_arrays.fetch_columns)."""
+    labels, y = data.values()
+    N = len(y)
     x = np.arange(1, N+1)
-    y = [ num for (s, num) in data ]
-    labels = [ s for (s, num) in data ]
     width = 1
     bar1 = plt.bar( x, y, width, color="grey" )
     plt.ylabel(ylabel_name  )
@@ -37,7 +39,7 @@ con.text_factory = str
 bioregions = cur.execute("""SELECT DISTINCT(biogeographic_region) AS region, COUNT(site_id) AS sites FROM
                             miscabundancedb_sites
                             GROUP BY region""")
-bioregions = cur.fetchall()
+bioregions = fetch_columns(cur)
 #Make bar graph of sites per biogeographic region
 bioregions_graph = './sad-data/chapter2/bioregions.png'
 ylabel_name = "Number of sites"
@@ -48,7 +50,7 @@ bar_graph(bioregions_graph, bioregions, ylabel_name, xlabel_name)
 num_taxa = cur.execute("""SELECT DISTINCT(class) AS class, COUNT(species) AS count_individuals FROM
                             miscabundancedb_main
                             GROUP BY class""")
-num_taxa = cur.fetchall()
+num_taxa = fetch_columns(cur)
 #Make bar graph of number of individuals for each taxon
 taxa_graph = './sad-data/chapter2/num_taxa.png'
 ylabel_name = "Total individuals"
@@ -59,7 +61,7 @@ bar_graph(taxa_graph, num_taxa, ylabel_name, xlabel_name)
 sites_taxa = cur.execute("""SELECT DISTINCT(class) AS class, COUNT(DISTINCT(site_id)) AS sites FROM
                             miscabundancedb_main
                             GROUP BY class""")
-sites_taxa = cur.fetchall()
+sites_taxa = fetch_columns(cur)
 #Make bar graph of number of sites for each taxon
 taxa_sites_graph = './sad-data/chapter2/taxa_sites.png'
 ylabel_name = "Number of sites"
@@ -0,0 +1,70 @@
+""" Benchmark of the exact neutral model likelihood against the negative binomial proxy
+
+Fits the neutral model with the Etienne sampling formula (see sad_etienne) and
+the negative binomial to the same sites as sad-comparisons.py, and writes their
+log-likelihoods, the neutral parameters and the time taken by each fit to
+`<dataset>_neutral_benchmark.csv` in the data directory.
+
+python neutral-benchmark.py [data_dir] [--datasets bbs fia ...] [--cutoff 9]
+
+The Etienne log-likelihood is that of the unlabelled abundances given the
+number of individuals, so it is not directly comparable to the negative
+binomial log-likelihood (a product of per-species probabilities); the timings
+show the cost of fitting the neutral model directly.
+
+"""
+
+from __future__ import division
+
+import argparse
+import time
+from collections import OrderedDict
+
+import numpy as np
+from pandas import DataFrame
+
+import sad_comparison_functions as sad
+from sad_etienne import etienne_log_K, etienne_solver_stats, etienne_ll_stats
+
+def benchmark_site(stats):
+    """Returns the negative binomial and neutral fits of one site and the seconds each took."""
+    start = time.time()
+    paras = sad.get_par_site_stats(stats, 'negbin')
+    negbin_llik = sad.get_loglik_site_stats(stats, 'negbin', *paras) if paras else np.nan
+    negbin_time = time.time() - start
+
+    start = time.time()
+    log_K = etienne_log_K(stats)
+    theta, m = etienne_solver_stats(stats, log_K)
+    neutral_llik = etienne_ll_stats(stats, theta, m, log_K)
+    neutral_time = time.time() - start
+    return negbin_llik, negbin_time, neutral_llik, theta, m, neutral_time
+
+def benchmark_dataset(raw_data, cutoff = 9):
+    """Returns a DataFrame with the benchmark of each site with at least cutoff species."""
+    site_stats = sad.get_site_stats(raw_data, cutoff, positive_only = True)
+    results = [benchmark_site(stats) for stats in site_stats]
+    columns = ['negbin_llik', 'negbin_time', 'neutral_llik', 'neutral_theta', 'neutral_m', 'neutral_time']
+    table = DataFrame(OrderedDict([('site', [stats.site for stats in site_stats]),
+                                   ('S', [stats.S for stats in site_stats]),
+                                   ('N', [stats.N for stats in site_stats])]))
+    for i, column in enumerate(columns):
+        table[column] = [result[i] for result in results]
+    return table
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the exact neutral model fit against the negative binomial.')
+    parser.add_argument('data_dir', nargs='?', default='./sad-data/')
+    parser.add_argument('--datasets', nargs='+', default=['bbs', 'fia', 'gentry', 'mcdb'])
+    parser.add_argument('--cutoff', type=int, default=9,
+                        help='minimum number of species of a site, as in sad-comparisons.py')
+    args = parser.parse_args()
+
+    for dataset in args.datasets:
+        raw_data = sad.import_abundance(args.data_dir + dataset + '_spab.csv')
+        table = benchmark_dataset(raw_data, args.cutoff)
+        with sad.atomic_write(args.data_dir + dataset + '_neutral_benchmark.csv') as f:
+            table.to_csv(f, index=False)
+        print("%s: %s sites, negative binomial %.2f s, neutral %.2f s (slowest site %.2f s, N = %s)" %
+              (dataset, len(table), table['negbin_time'].sum(), table['neutral_time'].sum(),
+               table['neutral_time'].max(), table['N'][table['neutral_time'].idxmax()]))
@@ -8,6 +8,58 @@ To use a non-standard data directory:
 
 python sad-comparisons.py /path/to/data_dir
 
+To only refit sites that are new or have changed since the last run (e.g.,
+after adding a BBS year) and merge them into the existing results:
+
+python sad-comparisons.py --incremental
+
+Completed sites are checkpointed periodically; to pick up an interrupted
+run where it stopped:
+
+python sad-comparisons.py --resume
+
+Results for each dataset are written to a single compressed results store,
+`<dataset>_results.npz`. Add `--legacy-csv` to also write the older
+`_dist_test.csv`, `_likelihoods.csv`, `_relative_L.csv` and
+`_likelihood_results.csv` files (see also sad_results_store.py). To also load
+the results straight into the results database (and write
+`<dataset>_processed_results.csv`) without running sad-process-db.py:
+
+python sad-comparisons.py --database /path/to/SummarizedResults.sqlite
+
+Sites are fitted by `--processes` worker processes (1 by default) while a
+background thread writes checkpoints, the results store and the database.
+Each model fit of a site gets `--fit-timeout` seconds (600 by default); a
+model that times out or fails is recorded as NaN with a reason code in its
+`fit_status_` column (see sad_comparison_functions.FIT_STATUS) and the run
+goes on. The workers take the sites longest first, as predicted from the fitting times
+of earlier runs (see sad_scheduling.py), and the parallel efficiency of each
+dataset is reported.
+
+To spread the fitting over several machines sharing a filesystem, fit the
+sites through a work queue (see sad_work_queue.py):
+
+python sad-comparisons.py --queue /shared/sad-queue.sqlite
+
+This starts `--processes` local workers (0 for none), and any number of
+workers can be added on other nodes with:
+
+python sad_work_queue.py /shared/sad-queue.sqlite
+
+Sites with more than `--cutoff` species (9 by default) are compared. To
+check the sensitivity of the results to the richness cutoff, also write the
+AICc weights and winners at each of several cutoffs to `cutoff_<cutoff>/` in
+the data directory, with a summary of all of them in
+`cutoff_sweep_summary.csv`:
+
+python sad-comparisons.py --cutoffs 5 9 15
+
+The main results store, manifest and database stay at `--cutoff`. Cutoffs
+above it are filtered from its results. The sites needed only by lower
+cutoffs are compared in a results store of their own in `cutoff_sweep/`,
+which `--incremental`, `--resume` and `--queue` use like the main one, so
+each site is fitted once.
+
 To run data sets other than the default publicly available data add a file to
 the data directory (`./sad-data` by default) named `dataset_config.txt` that
 contains a list of dataset names, one on each line.
@@ -21,153 +73,430 @@ pip install git+https://github.com/weecology/macroecotools.git
 
 from __future__ import division
 
+import argparse
 import csv
+import itertools
 import numpy as np
 import os
 import sys
+import threading
+import time
+import traceback
+from Queue import Queue
+from StringIO import StringIO
 from math import log, exp
 
-from pandas import DataFrame
+from pandas import DataFrame, concat, read_csv
 
-import macroecotools
-import macroeco_distributions as md
+import sad_comparison_functions as sad
+from sad_comparison_functions import (MODELS, MODEL_K, PARAMETER_COLUMNS, STATUS_COLUMNS, FIT_COLUMNS,
+                                      FIT_TIMEOUT, SOLVER_VERSION, STATUS_OK, STATUS_NAN, CLOSED_FORM_MODELS, CLOSED_FORM_K,
+                                      CLOSED_FORM_PARAMETER_COLUMNS, CLOSED_FORM_STATUS_COLUMNS,
+                                      CLOSED_FORM_COLUMNS, BETA_LOOKUP)
+import sad_cutoff_sweep
+import sad_results_db
+import sad_scheduling
+import sad_work_queue
+from sad_model_selection import model_selection
+from sad_results_store import (get_store_path, read_results_store, write_results_store,
+                               export_legacy_csvs)
 
 def import_abundance(datafile):
     """Imports raw species abundance .csv files in the form: Site, Year, Species, Abundance."""
     raw_data = np.genfromtxt(datafile, dtype = "S15,i8,S50,i8", names = ['site','year','sp','ab'], delimiter = ",",comments = "#")
     return raw_data
 
-def model_comparisons(raw_data, dataset_name, data_dir, cutoff = 9):
-    """ Uses raw species abundance data to compare predicted vs. empirical species abundance distributions (SAD) and output results in csv files. 
+# Maximum number of fitted sites waiting for the ResultWriter
+WRITER_QUEUE_SIZE = 1000
+# Subdirectory of the data directory holding the fits of the sites that only
+# the cutoffs of a sweep below --cutoff compare (see get_sweep_results)
+SWEEP_DIR = 'cutoff_sweep'
+
+# All models compared, in model code order (see sad_results_db.MODEL_NAMES)
+ALL_MODELS = MODELS + CLOSED_FORM_MODELS
+ALL_MODEL_K = MODEL_K + CLOSED_FORM_K
+
+RESULTS_COLUMNS = (['site', 'S', 'N'] + ['AICc_' + model for model in ALL_MODELS] +
+                   ['likelihood_' + model for model in ALL_MODELS] +
+                   ['relative_ll_' + model for model in ALL_MODELS] +
+                   PARAMETER_COLUMNS + CLOSED_FORM_PARAMETER_COLUMNS + STATUS_COLUMNS + CLOSED_FORM_STATUS_COLUMNS)
+
+def compare_models(fits, closed_form):
+    """Adds the closed-form fits, AICc weights and relative likelihoods to a DataFrame of per-site fits.
+    
+    closed_form is a DataFrame with the CLOSED_FORM_COLUMNS of the sites (see
+    sad_comparison_functions.fit_closed_form_models). Returns a DataFrame
+    with RESULTS_COLUMNS, computed for all sites at once.
+    
+    """
+    results = fits[FIT_COLUMNS].merge(closed_form, on = 'site', how = 'left')
+    L = results[['likelihood_' + model for model in ALL_MODELS]].values.astype(float)
+    selection = model_selection(L, ALL_MODEL_K, results['S'].values, cutoff = 4)
+    for i, model in enumerate(ALL_MODELS):
+        results['AICc_' + model] = selection.weights[:, i]
+        results['relative_ll_' + model] = selection.relative_likelihoods[:, i]
+    return results[RESULTS_COLUMNS]
+
+def write_results(results, dataset_name, data_dir, legacy_csv = False):
+    """Writes the results DataFrame to the dataset's results store.
+    
+    The store is written atomically, so an interrupted run leaves either the
+    previous or the new version in place, never a partial one. If legacy_csv
+    is True the per-value-type csv files are also generated from it.
+    
+    """
+    write_results_store(get_store_path(data_dir, dataset_name), results)
+    if legacy_csv:
+        export_legacy_csvs(data_dir, dataset_name, results)
+
+def read_manifest(manifest_file):
+    """Reads a site manifest into a dictionary of site: (content hash, solver version).
+    
+    Manifests written before the solver version was recorded have None for
+    it, so none of their sites are reused. The cutoff column of older
+    manifests is ignored, since a site's fit does not depend on it.
+    
+    """
+    with open(manifest_file, 'rb') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        if len(header) == 2:
+            return dict((site, (site_hash, None)) for site, site_hash in reader)
+        return dict((row[0], (row[1], int(row[2]))) for row in reader)
+
+def write_manifest(manifest_file, hashes):
+    """Writes a dictionary of site: content hash and the SOLVER_VERSION to a site manifest."""
+    with sad.atomic_write(manifest_file) as f:
+        output = csv.writer(f)
+        output.writerow(['site', 'hash', 'solver_version'])
+        output.writerows((site, site_hash, SOLVER_VERSION) for site, site_hash in sorted(hashes.items()))
+
+def get_checkpoint_path(data_dir, dataset_name):
+    """Returns the path of the checkpoint for a dataset."""
+    return os.path.join(data_dir, dataset_name + '_checkpoint.csv')
+
+def read_checkpoint(checkpoint_file):
+    """Reads the sites fitted so far and the cursor (the last site fitted) from a checkpoint.
+    
+    Returns (cursor, rows); cursor is None if there is no usable checkpoint.
+    A batch whose append was cut short (e.g., by a crash) is ignored from
+    its incomplete last line on.
+    
+    """
+    if not os.path.exists(checkpoint_file):
+        return None, []
+    with open(checkpoint_file, 'rb') as f:
+        header = f.readline().strip()
+        if header != '# solver_version: %s' % SOLVER_VERSION:
+            print("Ignoring checkpoint %s made with other solvers" % checkpoint_file)
+            return None, []
+        content = f.read()
+    rows = read_csv(StringIO(content[:content.rfind('\n') + 1]), dtype={'site': str}, float_precision='round_trip')
+    if list(rows.columns) != FIT_COLUMNS:
+        print("Ignoring checkpoint %s made with other result columns" % checkpoint_file)
+        return None, []
+    rows = rows.values.tolist()
+    return (rows[-1][0] if rows else None), rows
+
+def start_checkpoint(checkpoint_file, rows):
+    """Atomically starts a checkpoint holding the sites fitted so far (e.g., those of a resumed run).
+    
+    Later batches are appended to it with append_checkpoint, so each fitted
+    site is only written once.
+    
+    """
+    with sad.atomic_write(checkpoint_file) as f:
+        f.write('# solver_version: %s\n' % SOLVER_VERSION)
+        output = csv.writer(f, lineterminator='\n')
+        output.writerow(FIT_COLUMNS)
+        output.writerows(rows)
+
+def append_checkpoint(checkpoint_file, rows):
+    """Appends a batch of fitted sites to a checkpoint and syncs it to disk."""
+    with open(checkpoint_file, 'ab') as f:
+        output = csv.writer(f, lineterminator='\n')
+        output.writerows(rows)
+        f.flush()
+        os.fsync(f.fileno())
+
+class ResultWriter(threading.Thread):
+    """Background thread that persists fitted sites while fitting goes on.
+    
+    Fitted rows (see FIT_COLUMNS) are handed over through a bounded queue, so
+    if writing falls behind the fitting loop blocks instead of piling rows up
+    in memory. Every checkpoint_every rows the writer appends the new batch
+    of sites to the checkpoint and, if a database is given, to the database. close() waits for the queue to drain and then writes the final
+    results store, site manifest and database tables. closed_form holds the
+    closed-form fits of all sites, which are added to the fitted rows (see
+    compare_models).
+    
+    """
+    def __init__(self, dataset_name, data_dir, previous, rows, hashes, closed_form,
+                 checkpoint_every = 50, legacy_csv = False, database = None,
+                 queue_size = WRITER_QUEUE_SIZE):
+        threading.Thread.__init__(self, name = dataset_name + ' writer')
+        self.daemon = True
+        self.dataset_name = dataset_name
+        self.data_dir = data_dir
+        self.previous = previous
+        self.rows = list(rows)
+        self.hashes = hashes
+        self.closed_form = closed_form
+        self.checkpoint_every = checkpoint_every
+        self.legacy_csv = legacy_csv
+        self.database = database
+        self.checkpoint_file = get_checkpoint_path(data_dir, dataset_name)
+        self.queue = Queue(maxsize = queue_size)
+        self.finish = False
+        self.results = None
+        self.error = None
+
+    def put(self, row):
+        """Queues one fitted row, blocking while the queue is full."""
+        self.queue.put(row)
+
+    def close(self, finish = True):
+        """Flushes the queue and stops the writer, returning the results DataFrame.
+        
+        If finish is False (e.g., the fitting was interrupted) only a checkpoint
+        of the sites fitted so far is written.
+        
+        """
+        self.finish = finish
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.results
+
+    def run(self):
+        con = sad_results_db.connect(self.database) if self.database else None
+        batch = []
+        try:
+            start_checkpoint(self.checkpoint_file, self.rows)
+            while True:
+                row = self.queue.get()
+                if row is None:
+                    break
+                if self.error is not None:
+                    continue # Keep draining so the fitting loop never blocks
+                try:
+                    self.rows.append(row)
+                    batch.append(row)
+                    if len(batch) == self.checkpoint_every:
+                        self.write_batch(con, batch)
+                        batch = []
+                except Exception as error:
+                    traceback.print_exc()
+                    self.error = error
+            if self.error is None:
+                if self.finish:
+                    self.write_final(con)
+                elif batch:
+                    self.write_batch(con, batch)
+        except Exception as error:
+            traceback.print_exc()
+            self.error = error
+        finally:
+            if con is not None:
+                con.close()
+
+    def write_batch(self, con, batch):
+        """Appends the batch to the checkpoint and adds it to the database."""
+        append_checkpoint(self.checkpoint_file, batch)
+        if con is not None:
+            sad_results_db.insert_results(con, self.dataset_name,
+                                          compare_models(DataFrame(batch, columns=FIT_COLUMNS), self.closed_form))
+
+    def write_final(self, con):
+        """Writes the results of all sites and removes the checkpoint."""
+        fits = concat([self.previous, DataFrame(self.rows, columns=FIT_COLUMNS)], ignore_index=True)
+        fits = fits.sort_values('site').reset_index(drop=True)
+        self.results = compare_models(fits, self.closed_form)
+        write_results(self.results, self.dataset_name, self.data_dir, self.legacy_csv)
+        write_manifest(os.path.join(self.data_dir, self.dataset_name + '_site_manifest.csv'), self.hashes)
+        if os.path.exists(self.checkpoint_file):
+            os.remove(self.checkpoint_file)
+        if con is not None:
+            sad_results_db.load_results(con, self.dataset_name, self.results, self.data_dir)
+
+def add_fit_status(fits):
+    """Adds the fit status columns to fits stored before they existed: NaN likelihoods are NaN fits."""
+    for model, column in zip(MODELS, STATUS_COLUMNS):
+        if column not in fits:
+            fits[column] = np.where(np.isnan(fits['likelihood_' + model].values.astype(float)), STATUS_NAN, STATUS_OK)
+    return fits
+
+def model_comparisons(raw_data, dataset_name, data_dir, cutoff = 9, incremental = False,
+                      resume = False, checkpoint_every = 50, legacy_csv = False,
+                      processes = 1, database = None, queue = None, workers = None, fit_timeout = FIT_TIMEOUT):
+    """ Uses raw species abundance data to compare predicted vs. empirical species abundance distributions (SAD) and output results to the dataset's results store (see sad_results_store). 
     
     Keyword arguments:
     raw_data: numpy structured array with 4 columns: 'site', 'year', 'sp' (species), 'ab' (abundance).
     dataset_name: short code to indicate the name of the dataset in the output file names.
     data_dir: directory in which to store results output.
     cutoff: minimum number of species required to run -1.
+    incremental: only fit sites that are new or whose abundances changed since the last run,
+    reusing the stored results for all other sites (see get_site_hash). Sites
+    stored with another SOLVER_VERSION are all refitted; a change of cutoff
+    only adds or drops sites.
+    resume: continue from the checkpoint left by an interrupted run.
+    checkpoint_every: number of fitted sites between checkpoints.
+    legacy_csv: also write the _dist_test, _likelihoods, _relative_L and
+    _likelihood_results csv files alongside the results store.
+    processes: number of worker processes fitting sites.
+    database: path of a results database (see sad_results_db) to load the
+    results into as they are fitted.
+    queue: path of a work queue (see sad_work_queue) to fit the sites through
+    instead of a local pool; processes is then ignored.
+    workers: the local worker processes of the queue (see
+    sad_work_queue.start_workers); the run stops if they have all died.
+    fit_timeout: wall-clock budget in seconds of each model fit (None for no
+    limit). A model that times out or fails gets NaN values and a reason code
+    in its fit_status_ column (see sad_comparison_functions.FIT_STATUS).
+    
+    All output is written by a ResultWriter thread, so writing overlaps with fitting.
     
     SAD models and packages used:
     Logseries (macroecotools/macroecodistributions)
     Poisson lognormal (macroecotools/macroecodistributions)
     Negative binomial (macroecotools/macroecodistributions)
     Zipf (macroecotools/macroecodistributions)
+    Geometric series (p = S / N)
+    METE truncated logseries (mete, with beta from the data directory's lookup table)
     
     Neutral theory: Neutral theory predicts the negative binomial distribution (Connolly et al. 2014. Commonness and rarity in the marine biosphere. PNAS 111: 8524-8529. http://www.pnas.org/content/111/23/8524.abstract
     
     """
-    usites = np.sort(np.unique(raw_data["site"]))
-    
-    # Open output files
-    f1 = open(data_dir + dataset_name + '_dist_test.csv','wb')
-    output1 = csv.writer(f1)
-    f2 = open(data_dir + dataset_name + '_likelihoods.csv','wb')
-    output2 = csv.writer(f2)
-    f3 = open(data_dir + dataset_name + '_relative_L.csv','wb')
-    output3 = csv.writer(f3)
-   
-    # Insert header
-    output1.writerow(['site', 'S', 'N', 'AICc_logseries', 'AICc_pln', 'AICc_negbin', 'AICc_zipf'])
-    output2.writerow(['site', 'S', 'N', 'likelihood_logseries', 'likelihood_pln', 'likelihood_negbin', 'likelihood_zipf'])
-    output3.writerow(['site', 'S', 'N', 'relative_ll_logseries', 'relative_ll_pln', 'relative_ll_negbin', 'relative_ll_zipf'])    
-
-    results = []
-    for site in usites:
-        subsites = raw_data["site"][raw_data["site"] == site]        
-        subabundance = raw_data["ab"][raw_data["site"] == site]
-        N = sum(subabundance) # N = total abundance for a site
-        S = len(subsites) # S = species richness at a site
-        if (min(subabundance) > 0) and (S > cutoff):
-            print("%s, Site %s, S=%s, N=%s" % (dataset_name, site, S, N))
-                        
-            # Calculate Akaike weight of species abundance models:
-            # Parameter k is the number of fitted parameters
-            k1 = 1
-            k2 = 2            
-            
-            # Calculate log-likelihoods of species abundance models and calculate AICc values:
-            # Logseries
-            p_untruncated = md.logser_solver(subabundance)
-            L_logser_untruncated = md.logser_ll(subabundance, p_untruncated) # Log-likelihood of untruncated logseries
-            AICc_logser_untruncated = macroecotools.AICc(k1, L_logser_untruncated, S) # AICc logseries untruncated
-            relative_ll_logser_untruncated = AICc_logser_untruncated# Relative likelihood untruncated logseries
-            
-            #Start making AICc list
-            AICc_list = [AICc_logser_untruncated]
-            likelihood_list = [L_logser_untruncated]
-            relative_likelihood_list = [relative_ll_logser_untruncated]          
-            
-            # Poisson lognormal
-            mu, sigma = md.pln_solver(subabundance)
-            L_pln = md.pln_ll(subabundance, mu,sigma) # Log-likelihood of Poisson lognormal
-            AICc_pln = macroecotools.AICc(k2, L_pln, S) # AICc Poisson lognormal
-            relative_ll_pln = macroecotools.AICc(k1, L_pln, S) #Relative likelihood, Poisson lognormal
-            # Add to AICc list
-            AICc_list = AICc_list + [AICc_pln]
-            likelihood_list = likelihood_list +  [L_pln]
-            relative_likelihood_list = relative_likelihood_list + [relative_ll_pln]
-       
-            # Negative binomial
-            n0, p0 = md.nbinom_lower_trunc_solver(subabundance)
-            L_negbin = md.nbinom_lower_trunc_ll(subabundance, n0, p0) # Log-likelihood of negative binomial
-            AICc_negbin = macroecotools.AICc(k2, L_negbin, S)# AICc negative binomial
-            relative_ll_negbin = macroecotools.AICc(k1, L_negbin, S) # Relative log-likelihood of negative binomial
-            # Add to AICc list
-            AICc_list = AICc_list + [AICc_negbin]
-            likelihood_list = likelihood_list +  [L_negbin]
-            relative_likelihood_list = relative_likelihood_list + [relative_ll_negbin]
-            
-            # Zipf distribution
-            par = md.zipf_solver(subabundance)
-            L_zipf = md.zipf_ll(subabundance, par) #Log-likelihood of Zipf distribution
-            AICc_zipf = macroecotools.AICc(k1, L_zipf, S)
-            relative_ll_zipf = AICc_zipf
-            #Add to AICc list
-            AICc_list = AICc_list + [AICc_zipf]
-            likelihood_list = likelihood_list +  [L_zipf]
-            relative_likelihood_list = relative_likelihood_list + [relative_ll_zipf]            
-            
-            # Calculate AICc weight            
-            weight = macroecotools.aic_weight(AICc_list, S, cutoff = 4)
-            
-            #Calculate relative likelihood
-            relative_likelihoods = macroecotools.aic_weight(relative_likelihood_list, S, cutoff = 4)
-            
-            # Convert weight to list
-            weights_output = weight.tolist()
-            
-            #Convert relative likelihoods to list
-            relative_likelihoods_output = relative_likelihoods.tolist() 
-                                                
-            # Format results for output
-            for weight in weights_output:
-                results1 = [[site, S, N] + weights_output]
-            results2 = [[site, S, N] + likelihood_list]
-            results3 = [[site, S, N] + relative_likelihoods_output]
-            results.append([site, S, N] + weights_output  + likelihood_list + relative_likelihoods_output)
-
-            # Save results to a csv file:
-            output1.writerows(results1)
-            output2.writerows(results2)
-            output3.writerows(results3)
-
-    results = DataFrame(results, columns=['site', 'S', 'N', 'AICc_logseries', 'AICc_pln', 'AICc_negbin',
-                                         'AICc_zipf', 'likelihood_logseries', 'likelihood_pln',
-                                         'likelihood_negbin', 'likelihood_zipf', 'relative_ll_logseries',
-                                         'relative_ll_pln', 'relative_ll_negbin', 'relative_ll_zipf'])
-    results.to_csv(os.path.join(data_dir, dataset_name +  '_likelihood_results.csv'), index=False)
-    f1.close()
-    f2.close()
-    f3.close()           
+    results_file = get_store_path(data_dir, dataset_name)
+    manifest_file = os.path.join(data_dir, dataset_name + '_site_manifest.csv')
+    checkpoint_file = get_checkpoint_path(data_dir, dataset_name)
+    
+    site_stats = sad.get_site_stats(raw_data, cutoff, positive_only = True)
+    hashes = dict((stats.site, sad.get_site_hash(stats)) for stats in site_stats)
+    
+    # The closed-form models cost next to nothing, so they are fitted to all
+    # sites at once on every run
+    closed_form = DataFrame(sad.fit_closed_form_models(site_stats, os.path.join(data_dir, BETA_LOOKUP)),
+                            columns=CLOSED_FORM_COLUMNS)
+    
+    # Reuse stored results for sites whose abundances are unchanged and that
+    # were fitted with the same solvers. A site's fit does not depend on the
+    # cutoff, so sites that have been removed from the data or are at or
+    # below the cutoff (those without a hash) are simply dropped here.
+    previous = DataFrame(columns=FIT_COLUMNS)
+    if incremental and os.path.exists(results_file) and os.path.exists(manifest_file):
+        manifest = read_manifest(manifest_file)
+        previous = add_fit_status(read_results_store(results_file))
+        unchanged = [manifest.get(site) == (hashes.get(site), SOLVER_VERSION) for site in previous['site']]
+        previous = previous.loc[unchanged, FIT_COLUMNS]
+    fitted_sites = set(previous['site'])
+    print("%s: reusing %s of %s sites" % (dataset_name, len(fitted_sites), len(site_stats)))
+
+    # Sites are not necessarily fitted in site order (see sad_scheduling), so
+    # the checkpointed rows themselves tell which sites have been fitted
+    cursor, rows = None, []
+    if resume:
+        cursor, rows = read_checkpoint(checkpoint_file)
+        # A checkpoint of a run with a lower cutoff may hold sites not compared now
+        rows = [row for row in rows if str(row[0]) in hashes]
+        if cursor is not None:
+            print("%s: resuming with %s sites fitted" % (dataset_name, len(rows)))
+    fitted_sites.update(str(row[0]) for row in rows)
+    pending = [stats for stats in site_stats if stats.site not in fitted_sites]
+
+    writer = ResultWriter(dataset_name, data_dir, previous, rows, hashes, closed_form,
+                          checkpoint_every=checkpoint_every, legacy_csv=legacy_csv,
+                          database=database)
+    writer.start()
+    # Fitting times of this run, to calibrate the cost model of the next one
+    timings_file = os.path.join(data_dir, sad_scheduling.TIMINGS_FILE)
+    timed_sites, seconds = [], []
+    con = sad_work_queue.connect(queue) if queue is not None else None
+    start = time.time()
+    if con is not None:
+        fitted = ((stats, row, None) for stats, row in
+                  itertools.izip(pending, sad_work_queue.imap(con, dataset_name, pending, workers = workers)))
+    elif processes > 1:
+        # Longest predicted sites first, so no worker is left with a large site at the end
+        coefficients = sad_scheduling.calibrate_cost_model(sad_scheduling.read_timings(timings_file))
+        fitted = sad_scheduling.schedule_fits(pending, processes, coefficients, fit_timeout)
+    else:
+        fitted = ((stats, ) + sad_scheduling.timed_fit_site(stats, fit_timeout) for stats in pending)
+    try:
+        for stats, row, fit_seconds in fitted:
+            print("%s, Site %s, S=%s, N=%s" % (dataset_name, stats.site, stats.S, stats.N))
+            writer.put(row)
+            if fit_seconds is not None:
+                timed_sites.append(stats)
+                seconds.append(fit_seconds)
+    except BaseException:
+        fitted.close()
+        writer.close(finish=False)
+        raise
+    finally:
+        if con is not None:
+            con.close()
+    wall_seconds = time.time() - start
+    if timed_sites:
+        sad_scheduling.write_timings(timings_file, timed_sites, seconds)
+        if processes > 1:
+            achieved, ideal = sad_scheduling.parallel_efficiency(seconds, wall_seconds, processes)
+            print("%s: fitted %s sites in %.1f s on %s processes, parallel efficiency %.0f%% (ideal %.0f%%)" %
+                  (dataset_name, len(timed_sites), wall_seconds, processes, 100 * achieved, 100 * ideal))
+    return writer.close()
+
+def get_sweep_results(raw_data, results, dataset_name, data_dir, sweep_cutoff, cutoff, **options):
+    """Returns a dataset's results extended to the sites with more than sweep_cutoff species.
+    
+    results are those of the main run at cutoff. The sites only a lower
+    sweep_cutoff adds are compared by model_comparisons in their own results
+    store, manifest and checkpoint in <data_dir>/SWEEP_DIR, so they are
+    fitted once and reused like the main run's (options are its keyword
+    arguments, e.g., incremental, resume or queue). The main run's store,
+    manifest and database are left as they are.
+    
+    """
+    if sweep_cutoff >= cutoff:
+        return results
+    usites, site_index, S = np.unique(raw_data['site'], return_inverse = True, return_counts = True)
+    sweep_data = raw_data[S[site_index] <= cutoff]
+    sweep_dir = os.path.join(data_dir, SWEEP_DIR)
+    if not os.path.isdir(sweep_dir):
+        os.makedirs(sweep_dir)
+    sweep_results = model_comparisons(sweep_data, dataset_name, sweep_dir, cutoff = sweep_cutoff, **options)
+    return concat([results, sweep_results]).sort_values('site').reset_index(drop = True)
 
 
 if __name__ == '__main__':
     # Set up analysis parameters
     analysis_ext = '_spab.csv' # Extension for raw species abundance files
 
-    if len(sys.argv) > 1:
-        data_dir = sys.argv[1]
-    else:
-        data_dir = './sad-data/'
+    parser = argparse.ArgumentParser(description='Compare SAD models across sites.')
+    parser.add_argument('data_dir', nargs='?', default='./sad-data/')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only fit sites that are new or changed since the last run')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue from the checkpoint of an interrupted run')
+    parser.add_argument('--checkpoint-every', type=int, default=50,
+                        help='number of fitted sites between checkpoints')
+    parser.add_argument('--legacy-csv', action='store_true',
+                        help='also write the per-value-type csv result files')
+    parser.add_argument('--database', default=None,
+                        help='also load the results into this sqlite database (see sad_results_db)')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='number of worker processes fitting sites (local queue workers with --queue)')
+    parser.add_argument('--queue', default=None,
+                        help='fit the sites through this work queue file (see sad_work_queue)')
+    parser.add_argument('--cutoff', type=int, default=9,
+                        help='sites with more than this many species are compared')
+    parser.add_argument('--cutoffs', type=int, nargs='+', default=None,
+                        help='richness cutoffs to sweep, besides the main --cutoff run (see sad_cutoff_sweep)')
+    parser.add_argument('--fit-timeout', type=float, default=FIT_TIMEOUT,
+                        help='seconds allowed for each model fit of a site (0 for no limit)')
+    args = parser.parse_args()
+    data_dir = args.data_dir
 
     #Determine which datasets to use
     if os.path.exists(data_dir + 'dataset_config.txt'):
@@ -178,10 +507,50 @@ if __name__ == '__main__':
     else:
         datasets = ['bbs', 'fia', 'gentry', 'mcdb']
     
+    if args.database:
+        con = sad_results_db.connect(args.database)
+        sad_results_db.create_schema(con)
+        con.close()
+
+    workers = []
+    if args.queue:
+        con = sad_work_queue.connect(args.queue)
+        sad_work_queue.set_closed(con, False)
+        con.close()
+        workers = sad_work_queue.start_workers(args.queue, args.processes, fit_timeout=args.fit_timeout)
+
+    # The sweep's results are those of the main run, plus the sites only the
+    # cutoffs below --cutoff need
+    sweep_cutoffs = sorted(set(args.cutoffs or []))
+    sweep_rows = []
+
     # Starts actual analyses for each dataset in turn.
     for dataset in datasets:
         datafile = data_dir + dataset + analysis_ext
             
         raw_data = import_abundance(datafile) # Import data
     
-        model_comparisons(raw_data, dataset, data_dir, cutoff = 9) # Run analyses on data
+        results = model_comparisons(raw_data, dataset, data_dir, cutoff = args.cutoff, incremental = args.incremental,
+                                    resume = args.resume, checkpoint_every = args.checkpoint_every,
+                                    legacy_csv = args.legacy_csv, processes = args.processes,
+                                    database = args.database, queue = args.queue, workers = workers,
+                                    fit_timeout = args.fit_timeout) # Run analyses on data
+        if sweep_cutoffs:
+            sweep_results = get_sweep_results(raw_data, results, dataset, data_dir, sweep_cutoffs[0], args.cutoff,
+                                              incremental = args.incremental, resume = args.resume,
+                                              checkpoint_every = args.checkpoint_every,
+                                              processes = args.processes, queue = args.queue, workers = workers,
+                                              fit_timeout = args.fit_timeout)
+            sweep_rows += sad_cutoff_sweep.sweep_cutoffs(sweep_results, dataset, data_dir, sweep_cutoffs)
+
+    if sweep_cutoffs:
+        sad_cutoff_sweep.write_sweep_summary(os.path.join(data_dir, sad_cutoff_sweep.SUMMARY_FILE),
+                                             ALL_MODELS, sweep_rows)
+
+    if args.queue:
+        # Lets the workers, here and on other nodes, exit once the queue is drained
+        con = sad_work_queue.connect(args.queue)
+        sad_work_queue.set_closed(con, True)
+        con.close()
+        for worker in workers:
+            worker.join()
@@ -1,160 +1,107 @@
-""" Code to put results from sad-comparisons.py into database."""
+""" Code to put results from sad-comparisons.py into database.
+
+Usage:
+python sad-process-db.py [--data-dir DIR] [--database PATH] [--datasets bbs fia ...] [--rebuild] [--processes N]
+
+The result files of each dataset are read and turned into rows by a pool of
+worker processes; the rows are loaded through a single database connection.
+
+"""
 from __future__ import division
 
-import csv
+import argparse
 import sys
 import multiprocessing
 import itertools
 import os
+from collections import OrderedDict
 import numpy as np
-from math import log, exp
-from scipy import stats
-import sqlite3 as dbapi
+from pandas import DataFrame
 
+import sad_results_db
+from sad_results_store import get_store_path, read_results_store
 
-# Function to import the AICc results.
-def import_results(datafile):
-    """Imports raw result .csv files in the form: site, S, N, logseries_untruncated, pln, negbin, zipf."""
-    raw_results = np.genfromtxt(datafile, dtype = "S15, i8, i8, f8, f8, f8, f8", skip_header = 1, 
-                                names = ['site', 'S', 'N', 'logseries', 'pln', 'negbin', 'AICc_zipf'], delimiter = ",", missing_values = '', filling_values = '')
-    return raw_results
+results_ext = '_dist_test.csv' # Extension for raw model AICc results files
+likelihood_ext = '_likelihoods.csv' # Extension for raw model likelihood files
+relative_ll_ext = '_relative_L.csv' # Extenstion for raw model relative likelihood files
 
-# Function to determine the winning model for each site.
-def winning_model(data_dir, dataset_name, results):
-    # Open output files
-    output_processed = csv.writer(open(data_dir + dataset_name + '_processed_results.csv','wb'))
-    # Insert comment line
-    output_processed.writerow(["# 0 = Logseries, 1 = Poisson lognormal, 2 = Negative binomial, 3 = Zipf distribution"])
-    
-    # Insert header
-    output_processed.writerow(['dataset', 'site', 'S', 'N', "model_code", "model_name", "AICc_weight"])
-   
-    # Create dictionary of models and their corresponding codes
-    models = {0: 'Logseries', 1:'Poisson lognormal', 2:'Negative binomial', 3:'Zipf distribution'}
-   
-    for site in results:
-        site_results = site.tolist()
-        site_ID = site_results[0]
-        S = site_results[1]
-        N = site_results[2]
-        AICc_weights = site_results[3:]
+MODELS = sad_results_db.MODEL_COLUMNS # Model columns of the csv result files, in model code order
 
+DATASETS = ['bbs', 'cbc', 'fia', 'gentry', 'mcdb', 'naba', 'Reptilia', 'Coleoptera', 'Arachnida', 'Amphibia', 'Actinopterygii'] # Dataset ID codes
 
-        AICc_max_weight = max(AICc_weights) # This will return the actual AICc_weight of the winning model, given that the winning model is the one with the highest AICc weight.
+# Function to import the AICc results.
+def import_results(datafile):
+    """Imports raw result .csv files in the form: site, S, N, logseries, pln, negbin, zipf[, geom, mete].
+    
+    Files written before the closed-form models were added have only the
+    first four model columns.
+    
+    """
+    with open(datafile) as f:
+        n_models = len(f.readline().split(',')) - 3
+    raw_results = np.genfromtxt(datafile, dtype = "S15, i8, i8" + ", f8" * n_models, skip_header = 1, 
+                                names = ['site', 'S', 'N'] + MODELS[:n_models], delimiter = ",", missing_values = '', filling_values = '')
+    return raw_results
 
-        winning_model = AICc_weights.index(AICc_max_weight) # This will return the winning model, where the model is indicated by the index position
-        
-        model_name = models[winning_model]
+def import_legacy_results(data_dir, dataset_name):
+    """Combines a dataset's AICc weight, likelihood and relative likelihood csv files into one results DataFrame."""
+    columns = OrderedDict()
+    for ext, prefix in [(results_ext, 'AICc_'), (likelihood_ext, 'likelihood_'), (relative_ll_ext, 'relative_ll_')]:
+        raw_results = import_results(data_dir + dataset_name + ext)
+        for column in ('site', 'S', 'N'):
+            columns.setdefault(column, raw_results[column])
+        for model, column in zip(MODELS, raw_results.dtype.names[3:]):
+            columns[prefix + model] = raw_results[column]
+    return DataFrame(columns)
 
-        # Format results for output
-        processed_results = [[dataset_name] + [site_ID] + [S] + [N] + [winning_model] + [model_name] + [AICc_max_weight]]
-        
-                                        
-        # Save results to a csv file:            
-        output_processed.writerows(processed_results)
-        
-        # Save results to sqlite database      
-        #Create database for simulated data """
-        cur.execute("""CREATE TABLE IF NOT EXISTS ResultsWin
-                       (dataset_code TEXT,
-                        site TEXT,
-                        S INTEGER,
-                        N INTEGER,
-                        model_code INTEGER,
-                        model_name TEXT,
-                        AICc_weight_model FLOAT)""")
-           
-        cur.executemany("""INSERT INTO ResultsWin VALUES(?,?,?,?,?,?,?)""", processed_results)
-        con.commit()
-        
-    return processed_results
-        
-def process_results(data_dir, dataset_name, results, value_type):
-    for site in results:
-        site_results = site.tolist()
-        site_ID = site_results[0]
-        S = site_results[1]
-        N = site_results[2]
-        values = site_results[3:]
-        counter = 0
-        
-        models = {0: 'Logseries', 1:'Poisson lognormal', 2:'Negative binomial', 3:'Zipf distribution'}
-        for index, value in enumerate(values):
-            model_name = models[index]
-            processed_results = [[dataset_name] + [site_ID] + [S] + [N] + [index] + [model_name] + [value_type] + [value]]
+def prepare_dataset(data_dir, dataset_name):
+    """Reads one dataset's results, writes its _processed_results.csv and returns its dataset name, Wins rows and SiteResults rows.
+    
+    Runs in a worker process, so the rows are returned as lists rather than generators.
+    
+    """
+    if os.path.exists(get_store_path(data_dir, dataset_name)):
+        results = read_results_store(get_store_path(data_dir, dataset_name))
+    else:
+        results = import_legacy_results(data_dir, dataset_name)
+    
+    win_rows = sad_results_db.get_win_rows(dataset_name, results) # Finds the winning model for each site
+    sad_results_db.write_processed_results(data_dir, dataset_name, win_rows)
+    return dataset_name, win_rows, sad_results_db.get_site_rows(dataset_name, results)
 
-            # Save results to sqlite database      
-            #Create database for simulated data """
-            cur.execute("""CREATE TABLE IF NOT EXISTS RawResults
-                       (dataset_code TEXT,
-                        site TEXT,
-                        S INTEGER,
-                        N INTEGER,
-                        model_code INTEGER,
-                        model_name TEXT,
-                        value_type TEXT,
-                        value FLOAT)""")
-           
-            cur.executemany("""INSERT INTO RawResults VALUES(?,?,?,?,?,?,?,?)""", processed_results)
-            con.commit()
-        
-    return processed_results   
+def prepare_dataset_star(args):
+    """Unpacks the arguments of prepare_dataset for Pool.imap_unordered."""
+    return prepare_dataset(*args)
 
 if __name__ == '__main__':
-    # Set up analysis parameters
-    results_ext = '_dist_test.csv' # Extension for raw model AICc results files
-    likelihood_ext = '_likelihoods.csv' # Extension for raw model likelihood files
-    relative_ll_ext = '_relative_L.csv' # Extenstion for raw model relative likelihood files
-    database_name = input("Please provide the name of the output database. ")
-    
-    data_dir = input("Please provide the path to the data directory. ")
-    if not data_dir:
-        data_dir = './sad-data/chapter1/' # path to data directory
-    
+    parser = argparse.ArgumentParser(description='Load sad-comparisons.py results into an sqlite database.')
+    parser.add_argument('--data-dir', default='./sad-data/chapter1/',
+                        help='directory holding the results of each dataset')
+    parser.add_argument('--database', default=None,
+                        help='path of the output database (default: SummarizedResults.sqlite in the data directory)')
+    parser.add_argument('--datasets', nargs='+', default=DATASETS,
+                        help='dataset ID codes to load')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='drop and recreate the database tables first')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help='number of worker processes reading the result files')
+    args = parser.parse_args()
+    database = args.database or os.path.join(args.data_dir, 'SummarizedResults.sqlite')
+    data_dir = os.path.join(args.data_dir, '')
     
-    datasets = input("Please provide a list of dataset ID codes. ")
-    if not datasets:
-        datasets = ['bbs', 'cbc', 'fia', 'gentry', 'mcdb', 'naba', 'Reptilia', 'Coleoptera', 'Arachnida', 'Amphibia', 'Actinopterygii'] # Dataset ID codes
+    # Single writer connection; the workers only read and prepare rows.
+    con = sad_results_db.connect(database)
+    sad_results_db.create_schema(con, rebuild = args.rebuild)
     
-    # Asks for toggle variable so I don't have to rerun all the setup if it is already processed.
-    needs_processing = input("Data needs to be processed into an sqlite database, True or False?  ")  
+    pool = multiprocessing.Pool(processes = max(1, min(args.processes, len(args.datasets))))
+    tasks = [(data_dir, dataset) for dataset in args.datasets]
+    # Datasets are loaded in the order their workers finish.
+    for dataset, win_rows, site_rows in pool.imap_unordered(prepare_dataset_star, tasks):
+        sad_results_db.load_dataset(con, dataset, win_rows, site_rows)
+    pool.close()
+    pool.join()
     
-    # Starts actual processing for each set of results in turn.
-    if needs_processing == True:
-        # Set up database capabilities 
-        # Set up ability to query data
-        database = data_dir + database_name
-        con = dbapi.connect(database)
-        cur = con.cursor()
-        
-        # Switch con data type to string
-        con.text_factory = str
-        drop_tables = input("Database needs to be rebuilt, True or False?  ")
-        if drop_tables == True:
-            cur.execute("""DROP TABLE IF EXISTS ResultsWin""")
-            cur.execute("""DROP TABLE IF EXISTS RawResults""")
-            con.commit()
-            
-            
-        for dataset in datasets:
-            datafile = data_dir + dataset + results_ext
-            datafile2 = data_dir + dataset + likelihood_ext
-            datafile3 = data_dir + dataset + relative_ll_ext
-            
-            raw_results = import_results(datafile) # Import AICc weight data
-            
-            raw_results_likelihood = import_results(datafile2) # Import log-likelihood data
-            
-            raw_results_relative_ll = import_results(datafile3) #Import relative likelihood data
+    #Close connection to database
+    con.close()
     
-            winning_model(data_dir, dataset, raw_results) # Finds the winning model for each site
-            
-            process_results(data_dir, dataset, raw_results, 'AICc weight') #Turns the raw results into a database.
-            process_results(data_dir, dataset, raw_results_likelihood, 'likelihood') #Turns the raw results into a database.
-            process_results(data_dir, dataset, raw_results_relative_ll, 'relative likelihood') #Turns the raw results into a database.
-            
-        
-        #Close connection to database
-        con.close()
-        
-        print("Database complete.")
+    print("Database complete.")
@@ -1,44 +1,361 @@
-"""Aggregated functions for the sad-comparison project"""
+"""Aggregated functions for the sad-comparison project
+
+The distributions, optimizers, mete and macroecotools are only imported when
+first needed, so that importing this module (e.g., for atomic_write or
+get_site_stats) stays fast.
+
+"""
 from __future__ import division
+from collections import namedtuple
+from contextlib import contextmanager
+import cPickle as pickle
+import hashlib
+import importlib
+import os
+import signal
+import threading
 import numpy as np
-import macroeco_distributions as md
-import macroecotools
-import scipy.stats.distributions as sd
-import mete
+from scipy.special import logsumexp
 import csv
 
-# Define dictionary to match names to distributions
-DIST_DIC = {'logser': sd.logser,
-            'geom': sd.geom,
-            'zipf': sd.zipf,
-            'negbin': md.nbinom_lower_trunc,
-            'pln': md.pln}
+# Define dictionary to match names to distributions, as (module, distribution)
+DIST_DIC = {'logser': ('scipy.stats.distributions', 'logser'),
+            'geom': ('scipy.stats.distributions', 'geom'),
+            'zipf': ('scipy.stats.distributions', 'zipf'),
+            'negbin': ('macroeco_distributions', 'nbinom_lower_trunc'),
+            'pln': ('macroeco_distributions', 'pln')}
+
+# SAD models compared and their numbers of fitted parameters
+MODELS = ['logseries', 'pln', 'negbin', 'zipf']
+MODEL_K = [1, 2, 2, 1]
+
+# Fitted parameters of each model, in the order they are returned by fit_site
+PARAMETER_COLUMNS = ['par_logseries_p', 'par_pln_mu', 'par_pln_sigma',
+                     'par_negbin_n', 'par_negbin_p', 'par_zipf_a']
+
+# Reason codes of the fit of each model (the fit_status_ columns)
+STATUS_OK, STATUS_TIMEOUT, STATUS_ERROR, STATUS_NAN = range(4)
+FIT_STATUS = {STATUS_OK: 'ok', STATUS_TIMEOUT: 'timed out', STATUS_ERROR: 'error', STATUS_NAN: 'NaN fit'}
+STATUS_COLUMNS = ['fit_status_' + model for model in MODELS]
+
+FIT_COLUMNS = (['site', 'S', 'N'] + ['likelihood_' + model for model in MODELS] + PARAMETER_COLUMNS +
+               STATUS_COLUMNS)
+
+# Default wall-clock budget of each model fit, in seconds
+FIT_TIMEOUT = 600
+
+# Version of the models and solvers of fit_site; stored fits made with another
+# version are refitted (see sad-comparisons.py's manifest and sad_work_queue).
+# Increase it whenever a change to them changes the fitted values.
+SOLVER_VERSION = 3
+
+# Models fitted to all sites at once from their S and N (see
+# fit_closed_form_models): the geometric series (p = S / N) and METE's
+# truncated logseries (beta from a lookup table), one parameter each
+CLOSED_FORM_MODELS = ['geom', 'mete']
+CLOSED_FORM_K = [1, 1]
+CLOSED_FORM_PARAMETER_COLUMNS = ['par_geom_p', 'par_mete_beta']
+CLOSED_FORM_STATUS_COLUMNS = ['fit_status_' + model for model in CLOSED_FORM_MODELS]
+CLOSED_FORM_COLUMNS = (['site'] + ['likelihood_' + model for model in CLOSED_FORM_MODELS] +
+                       CLOSED_FORM_PARAMETER_COLUMNS + CLOSED_FORM_STATUS_COLUMNS)
+# Lookup table of METE's beta by (S, N), in mete's format
+BETA_LOOKUP = 'beta_lookup_table.pck'
+
+def get_dist(dist_name):
+    """Returns the distribution with the designated name, importing its module on first use."""
+    module_name, name = DIST_DIC[dist_name]
+    return getattr(importlib.import_module(module_name), name)
 
 def import_abundance(datafile):
     """Imports raw species abundance .csv files in the form: Site, Year, Species, Abundance."""
     raw_data = np.genfromtxt(datafile, dtype = "S30,i8,S30,i8", names = ['site','year','sp','ab'], delimiter = ",",comments = "#")
     return raw_data
 
-def get_par_multi_dists(ab, dist_name):
-    """Returns the parameters given the observed abundances and the designated distribution."""
+# Per-site summaries shared by all of the solvers and likelihoods.
+# values/counts is the histogram of distinct abundances and ab is the
+# abundance vector itself, in the order of the data.
+SiteStats = namedtuple('SiteStats', ['site', 'S', 'N', 'min_ab', 'max_ab', 'sum_log_ab',
+                                     'values', 'counts', 'ab'])
+
+def get_site_stats(raw_data, cutoff = None, positive_only = False):
+    """Returns a list of SiteStats, one per site, sorted by site.
+    
+    All sites are reduced in a single vectorized pass over raw_data, a
+    structured array with 'site' and 'ab' columns. If cutoff is given only
+    sites with S > cutoff are returned, and if positive_only only sites with
+    no zero abundances (as model_comparisons).
+    
+    """
+    order = np.argsort(raw_data['site'], kind = 'mergesort')
+    sites = raw_data['site'][order]
+    ab = raw_data['ab'][order]
+    usites, starts, S = np.unique(sites, return_index = True, return_counts = True)
+    sorted_ab = raw_data['ab'][np.lexsort((raw_data['ab'], raw_data['site']))]
+    
+    ab_float = ab.astype(float)
+    with np.errstate(divide = 'ignore'):
+        log_ab = np.log(ab_float)
+    N = np.add.reduceat(ab, starts)
+    min_ab = sorted_ab[starts]
+    max_ab = sorted_ab[starts + S - 1]
+    sum_log_ab = np.add.reduceat(log_ab, starts)
+    
+    # Histogram of distinct abundances: a new value starts wherever either
+    # the site or the abundance changes in the sorted data
+    new_value = np.ones(len(ab), dtype = bool)
+    new_value[1:] = (sorted_ab[1:] != sorted_ab[:-1]) | (sites[1:] != sites[:-1])
+    value_starts = np.flatnonzero(new_value)
+    values = sorted_ab[value_starts]
+    counts = np.diff(np.append(value_starts, len(ab)))
+    value_splits = np.searchsorted(value_starts, starts[1:])
+    site_values = np.split(values, value_splits)
+    site_counts = np.split(counts, value_splits)
+    site_ab = np.split(ab, starts[1:])
+    
+    keep = np.ones(len(usites), dtype = bool)
+    if cutoff is not None:
+        keep &= S > cutoff
+    if positive_only:
+        keep &= min_ab > 0
+    keep = np.flatnonzero(keep)
+    return [SiteStats(usites[i], S[i], N[i], min_ab[i], max_ab[i], sum_log_ab[i],
+                      site_values[i], site_counts[i], site_ab[i]) for i in keep]
+
+def get_single_site_stats(ab, site = None):
+    """Returns the SiteStats for a single abundance vector."""
+    ab = np.asarray(ab)
+    raw_data = np.zeros(len(ab), dtype = [('site', 'i8'), ('ab', ab.dtype)])
+    raw_data['ab'] = ab
+    stats = get_site_stats(raw_data)[0]
+    return stats._replace(site = site)
+
+def get_site_hash(stats):
+    """Returns a content hash of a site's sorted abundance vector."""
+    ab = np.ascontiguousarray(np.sort(stats.ab), dtype = '<i8')
+    return hashlib.sha1(ab.tobytes()).hexdigest()
+
+def get_loglik_site_stats(stats, dist_name, *pars):
+    """Returns the log-likelihood of a site, evaluating the pmf once per distinct abundance."""
+    dist = get_dist(dist_name)
+    if dist_name == 'pln': pars += (True,)
+    return np.sum(stats.counts * dist.logpmf(stats.values, *pars))
+
+# The solvers and likelihoods of the compared models are macroeco_distributions'
+# own, run on the site's abundance vector in the order of the data, so the fits
+# are those of the published results (md's optimizers are sensitive to the
+# order of the abundances).
+
+def logser_solver_stats(stats):
+    """MLE of the logseries parameter p (md.logser_solver)."""
+    import macroeco_distributions as md
+    return md.logser_solver(stats.ab)
+
+def pln_solver_stats(stats):
+    """MLE of the Poisson lognormal parameters mu and sigma (md.pln_solver)."""
+    import macroeco_distributions as md
+    return md.pln_solver(stats.ab)
+
+def nbinom_lower_trunc_solver_stats(stats):
+    """MLE of the negative binomial (truncated at 1) parameters n and p (md.nbinom_lower_trunc_solver)."""
+    import macroeco_distributions as md
+    return md.nbinom_lower_trunc_solver(stats.ab)
+
+def zipf_solver_stats(stats):
+    """MLE of the Zipf parameter with x_min = 1 (md.zipf_solver)."""
+    import macroeco_distributions as md
+    return md.zipf_solver(stats.ab)
+
+def get_par_site_stats(stats, dist_name):
+    """Returns the parameters given a site's SiteStats and the designated distribution."""
     if dist_name == 'logser':
-        beta = mete.get_beta(len(ab), sum(ab), version = 'untruncated')
+        import mete
+        beta = mete.get_beta(stats.S, stats.N, version = 'untruncated')
         par = (np.exp(-beta), )
     elif dist_name == 'pln':
-        par = md.pln_solver(ab)
+        par = pln_solver_stats(stats)
     elif dist_name == 'geom':
-        par = (len(ab) / sum(ab), )
+        par = (stats.S / stats.N, )
     elif dist_name == 'negbin':
-        par = md.negbin_solver(ab)
+        par = nbinom_lower_trunc_solver_stats(stats)
         if np.isnan(par[0]):
             par = None
     elif dist_name == 'zipf':
-        par = (md.zipf_solver(ab), )
+        par = (zipf_solver_stats(stats), )
     else: 
         print "Error: distribution not recognized."
         par = None    
     return par
 
+class FitTimeout(Exception):
+    """Raised when a model fit runs out of its wall-clock budget."""
+
+@contextmanager
+def time_limit(seconds):
+    """Raises FitTimeout in the block once it has run for seconds (no limit if seconds is None or 0).
+    
+    The limit uses SIGALRM, so it is only applied in the main thread of a
+    process, and code that does not return to the interpreter (a single long
+    numpy or C call) is interrupted once it does.
+    
+    """
+    if not seconds or not hasattr(signal, 'setitimer') or threading.current_thread().name != 'MainThread':
+        yield
+        return
+    def handler(signum, frame):
+        raise FitTimeout()
+    previous = signal.signal(signal.SIGALRM, handler)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+def fit_model(stats, dist_name, solver, loglik, n_pars, timeout = FIT_TIMEOUT):
+    """Fits one model to a site within timeout seconds.
+    
+    loglik is the name of the model's log-likelihood function in
+    macroeco_distributions. Returns the log-likelihood, the list of
+    parameters and the reason code of the fit (see FIT_STATUS). A fit that times out, raises an error or gives a
+    NaN has a NaN log-likelihood (and NaN parameters if it did not finish).
+    
+    """
+    import macroeco_distributions as md
+    try:
+        with time_limit(timeout):
+            pars = list(np.atleast_1d(solver(stats)))
+            L = getattr(md, loglik)(stats.ab, *pars)
+    except FitTimeout:
+        print("Warning: %s fit of site %s timed out after %s s" % (dist_name, stats.site, timeout))
+        return np.nan, [np.nan] * n_pars, STATUS_TIMEOUT
+    except Exception as error:
+        print("Warning: %s fit of site %s failed: %r" % (dist_name, stats.site, error))
+        return np.nan, [np.nan] * n_pars, STATUS_ERROR
+    if np.isnan(L) or np.any(np.isnan(pars)):
+        return np.nan, pars, STATUS_NAN
+    return L, pars, STATUS_OK
+
+# Solver, macroeco_distributions log-likelihood and number of parameters of
+# each model in MODELS. The logseries is the untruncated one.
+MODEL_SOLVERS = [('logser', logser_solver_stats, 'logser_ll', 1),
+                 ('pln', pln_solver_stats, 'pln_ll', 2),
+                 ('negbin', nbinom_lower_trunc_solver_stats, 'nbinom_lower_trunc_ll', 2),
+                 ('zipf', zipf_solver_stats, 'zipf_ll', 1)]
+
+def import_fit_modules():
+    """Imports the modules the solvers and likelihoods load on first use, so that no time limit interrupts an import."""
+    import scipy.optimize
+    import macroeco_distributions
+    for dist_name, solver, loglik, n_pars in MODEL_SOLVERS:
+        get_dist(dist_name)
+
+def fit_site(stats, timeout = FIT_TIMEOUT):
+    """Fits all SAD models to one site and returns its log-likelihoods, parameters and fit status codes (see FIT_COLUMNS).
+    
+    Each model is fitted within timeout seconds; a model that times out or
+    fails is recorded as NaN with its reason code without affecting the
+    others.
+    
+    """
+    import_fit_modules()
+    lliks, pars, status = [], [], []
+    for dist_name, solver, loglik, n_pars in MODEL_SOLVERS:
+        L, model_pars, code = fit_model(stats, dist_name, solver, loglik, n_pars, timeout)
+        lliks.append(L)
+        pars += model_pars
+        status.append(code)
+    return [stats.site, stats.S, stats.N] + lliks + pars + status
+
+def get_mete_betas(S, N, beta_lookup_file = None):
+    """Returns METE's beta (upper truncated at N, eq. 7.27 in Harte 2011) for each pair of S and N (N > S).
+    
+    Each distinct pair is solved once; solved pairs are kept in
+    beta_lookup_file (a pickled {(S, N): beta}, as mete.build_beta_dict), so
+    later runs only solve pairs they have not seen.
+    
+    """
+    import mete
+    lookup = {}
+    if beta_lookup_file and os.path.exists(beta_lookup_file):
+        with open(beta_lookup_file, 'rb') as f:
+            lookup = pickle.load(f)
+    pairs = [(int(S_i), int(N_i)) for S_i, N_i in zip(S, N)]
+    new = sorted(set(pairs) - set(lookup))
+    for S_i, N_i in new:
+        lookup[(S_i, N_i)] = mete.get_beta(S_i, N_i)
+    if new and beta_lookup_file:
+        with atomic_write(beta_lookup_file) as f:
+            pickle.dump(lookup, f, pickle.HIGHEST_PROTOCOL)
+    return np.array([lookup[pair] for pair in pairs], dtype = float)
+
+def mete_log_normalization(beta, N):
+    """Returns log(sum(exp(-beta * n) / n for n = 1, ..., N)) for arrays of beta and N.
+    
+    Where the terms beyond N are negligible this is the untruncated
+    -log(1 - exp(-beta)); the sum is only done term by term elsewhere.
+    
+    """
+    x = np.exp(-beta)
+    log_Z = np.empty(len(beta))
+    with np.errstate(divide = 'ignore', invalid = 'ignore', over = 'ignore'):
+        untruncated = -np.log1p(-x)
+        tail_bound = x ** (N + 1) / ((N + 1) * (1 - x))
+        closed = (x < 1) & (tail_bound < 1e-12 * untruncated)
+    log_Z[closed] = np.log(untruncated[closed])
+    for i in np.flatnonzero(~closed):
+        n = np.arange(1, N[i] + 1)
+        log_Z[i] = logsumexp(-beta[i] * n - np.log(n))
+    return log_Z
+
+def fit_closed_form_models(site_stats, beta_lookup_file = None):
+    """Fits the CLOSED_FORM_MODELS to all sites at once, returning a row per site (see CLOSED_FORM_COLUMNS).
+    
+    Sites with N = S (all singletons) have no METE solution and get a NaN fit.
+    
+    """
+    S = np.array([stats.S for stats in site_stats], dtype = float)
+    N = np.array([stats.N for stats in site_stats], dtype = float)
+    sum_log_ab = np.array([stats.sum_log_ab for stats in site_stats], dtype = float)
+    valid = N > S
+    
+    # Geometric series: S * log(p) + (N - S) * log(1 - p), which is 0 if p = 1
+    p = S / N
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        L_geom = np.where(valid, S * np.log(p) + (N - S) * np.log1p(-p), 0.0)
+    
+    # METE: p(n) = exp(-beta * n) / (n * Z) for n = 1, ..., N
+    beta, log_Z = np.full(len(S), np.nan), np.full(len(S), np.nan)
+    beta[valid] = get_mete_betas(S[valid], N[valid], beta_lookup_file)
+    log_Z[valid] = mete_log_normalization(beta[valid], N[valid])
+    L_mete = -beta * N - sum_log_ab - S * log_Z
+    
+    status_geom = np.where(np.isnan(L_geom), STATUS_NAN, STATUS_OK)
+    status_mete = np.where(np.isnan(L_mete), STATUS_NAN, STATUS_OK)
+    return [[stats.site] + list(values) for stats, values in
+            zip(site_stats, zip(L_geom, L_mete, p, beta, status_geom, status_mete))]
+
+@contextmanager
+def atomic_write(filename, mode = 'wb'):
+    """Opens a temporary file that replaces filename only once it has been completely written."""
+    tmp_filename = filename + '.tmp'
+    f = open(tmp_filename, mode)
+    try:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+    except:
+        f.close()
+        os.remove(tmp_filename)
+        raise
+    f.close()
+    if os.name == 'nt' and os.path.exists(filename):
+        os.remove(filename)
+    os.rename(tmp_filename, filename)
+
+def get_par_multi_dists(ab, dist_name):
+    """Returns the parameters given the observed abundances and the designated distribution."""
+    return get_par_site_stats(get_single_site_stats(ab), dist_name)
+
 def get_pred_iterative(cdf_obs, dist, *pars):
     """Function to get predicted abundances (reverse-sorted) for distributions with no analytical ppf."""
     cdf_obs = np.sort(cdf_obs)
@@ -58,7 +375,7 @@ def get_pred_iterative(cdf_obs, dist, *pars):
 
 def get_sample_multi_dists(S, dist_name, *pars):
     """Returns a random sample of length S from the designated distribution."""
-    dist = DIST_DIC[dist_name]
+    dist = get_dist(dist_name)
     if dist_name == 'pln': pars += (True, )
     rand_smp = dist.rvs(*pars, size = S)
     return rand_smp
@@ -71,7 +388,7 @@ def get_pred_multi_dists(S, dist_name, *pars):
     """
     cdf = (np.arange(1, S + 1) - 0.5) / S
     cdf = cdf[::-1]
-    dist = DIST_DIC[dist_name]
+    dist = get_dist(dist_name)
     if dist_name == 'pln': pars += (True, )
     if dist_name == 'geom': pred = dist.ppf(cdf, *pars)
     else:  # For all other distributions, need to call the iterative method
@@ -84,7 +401,7 @@ def get_loglik_multi_dists(ab, dist_name, *pars):
     the designated distribution, and the parameters.
     
     """
-    dist = DIST_DIC[dist_name]
+    dist = get_dist(dist_name)
     if dist_name == 'pln': pars += (True,)
     loglik = sum(np.log(dist.pmf(ab, *pars)))
     return loglik
@@ -97,7 +414,7 @@ def get_ks_multi_dists(ab, dist_name, *pars):
     """
     ab = sorted(ab)
     emp_cdf = (np.arange(1, len(ab) + 1) - 0.5) / len(ab)  
-    dist = DIST_DIC[dist_name]
+    dist = get_dist(dist_name)
     if dist_name == 'pln': pars += (True, )
     ks = max(abs(emp_cdf - np.array([dist.cdf(x, *pars) for x in ab])))
     return ks
@@ -107,19 +424,17 @@ def get_obs_pred_multi_dists(dat_dir, file_name, dist_name, cutoff = 9):
     out_write = open(dat_dir + file_name + '_' + dist_name + '_obs_pred.csv', 'wb')
     out = csv.writer(out_write)    
     dat = import_abundance(dat_dir + file_name + '_spab.csv')
-    sites = np.unique(dat['site'])
-    for site in sites:
-        dat_site = dat[dat['site'] == site]
-        obs_site = np.sort(dat_site['ab'])[::-1]
-        if len(obs_site) > cutoff: 
-            pars_dist_site = get_par_multi_dists(obs_site, dist_name)
-            if pars_dist_site and (np.any(np.isnan(pars_dist_site)) == 0):  # The estimated parameters exist and are not NANs
-                pred_dist_site = get_pred_multi_dists(len(obs_site), dist_name, *pars_dist_site)
-                results = np.zeros((len(obs_site), ), dtype = ('S30, i8, i8'))
-                results['f0'] = np.array([site] * len(obs_site))
-                results['f1'] = obs_site
-                results['f2'] = pred_dist_site
-                out.writerows(results)
+    for stats in get_site_stats(dat, cutoff):
+        site = stats.site
+        obs_site = np.sort(stats.ab)[::-1]
+        pars_dist_site = get_par_site_stats(stats, dist_name)
+        if pars_dist_site and (np.any(np.isnan(pars_dist_site)) == 0):  # The estimated parameters exist and are not NANs
+            pred_dist_site = get_pred_multi_dists(len(obs_site), dist_name, *pars_dist_site)
+            results = np.zeros((len(obs_site), ), dtype = ('S30, i8, i8'))
+            results['f0'] = np.array([site] * len(obs_site))
+            results['f1'] = obs_site
+            results['f2'] = pred_dist_site
+            out.writerows(results)
     out_write.close()
             
 def sim_stats(ab, dist_name, Nsim, test_stat):
@@ -136,10 +451,16 @@ def sim_stats(ab, dist_name, Nsim, test_stat):
     and the second element is a list of length Nsim with the output for each simulated ab.
     
     """
-    pars = get_par_multi_dists(ab, dist_name)
+    return sim_site_stats(get_single_site_stats(ab), dist_name, Nsim, test_stat)
+
+def sim_site_stats(stats, dist_name, Nsim, test_stat):
+    """Returns sim_stats for a site from its SiteStats (see sad_shared_data.sim_sites_stats to simulate many sites)."""
+    ab = stats.ab
+    pars = get_par_site_stats(stats, dist_name)
     if test_stat == 'loglik': test_func = get_loglik_multi_dists
     elif test_stat == 'ks': test_func = get_ks_multi_dists
     elif test_stat == 'r2': 
+        import macroecotools
         def test_func(ab, dist_name, *pars):
             pred = get_pred_multi_dists(len(ab), dist_name, *pars)
             r2 = macroecotools.obs_pred_rsquare(sorted(ab, reverse = True), pred)
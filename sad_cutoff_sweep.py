@@ -0,0 +1,75 @@
+"""Richness cutoff sensitivity from a single fitting pass
+
+Models are fitted and compared site by site, so the results at the lowest
+richness cutoff contain those of every higher cutoff: the rows of the sites
+with more than cutoff species. The main run of sad-comparisons.py keeps its
+own cutoff; the sites only lower cutoffs need are fitted once for the sweep
+(see its get_sweep_results). sweep_cutoffs filters a dataset's results for
+each cutoff and writes, to <data_dir>/cutoff_<cutoff>/,
+
+<dataset>_dist_test.csv  --  the AICc weights of each site and model.
+<dataset>_processed_results.csv  --  the winning model of each site.
+
+and returns a summary row per cutoff (see SUMMARY_COLUMNS) with the number of
+sites and the wins and mean AICc weight of each model, which
+write_sweep_summary collects into SUMMARY_FILE.
+
+"""
+from __future__ import division
+import csv
+import os
+
+import numpy as np
+
+from sad_comparison_functions import atomic_write
+from sad_model_selection import best_models
+from sad_results_db import get_value_columns, get_win_rows, write_processed_results
+from sad_results_store import get_legacy_view
+
+CUTOFF_DIR = 'cutoff_%s'
+SUMMARY_FILE = 'cutoff_sweep_summary.csv'
+
+def get_summary_columns(models):
+    """Returns the columns of the summary rows of the given models."""
+    return (['cutoff', 'dataset', 'sites'] + ['wins_' + model for model in models] +
+            ['mean_AICc_' + model for model in models])
+
+def get_cutoff_results(results, cutoff):
+    """Returns the results of the sites with more than cutoff species (as get_site_stats)."""
+    return results[results['S'] > cutoff].reset_index(drop = True)
+
+def summarize_cutoff(results, dataset_name, cutoff):
+    """Returns the summary row of a dataset's results at a cutoff."""
+    weights = results[get_value_columns(results, 'AICc_')].values.astype(float)
+    model_codes, best_weights = best_models(weights)
+    wins = np.bincount(model_codes[model_codes >= 0], minlength = weights.shape[1])
+    with np.errstate(invalid = 'ignore'):
+        valid = ~np.isnan(weights)
+        mean_weights = np.where(valid, weights, 0).sum(axis = 0) / valid.sum(axis = 0)
+    return [cutoff, dataset_name, len(results)] + wins.tolist() + mean_weights.tolist()
+
+def sweep_cutoffs(results, dataset_name, data_dir, cutoffs):
+    """Writes a dataset's AICc weights and winners at each cutoff and returns their summary rows.
+
+    results are the dataset's results at a cutoff no higher than any of
+    cutoffs (see sad-comparisons.py's get_sweep_results).
+
+    """
+    rows = []
+    for cutoff in cutoffs:
+        cutoff_dir = os.path.join(data_dir, CUTOFF_DIR % cutoff)
+        if not os.path.isdir(cutoff_dir):
+            os.makedirs(cutoff_dir)
+        cutoff_results = get_cutoff_results(results, cutoff)
+        with atomic_write(os.path.join(cutoff_dir, dataset_name + '_dist_test.csv')) as f:
+            get_legacy_view(cutoff_results, ('AICc_', )).to_csv(f, index = False)
+        write_processed_results(cutoff_dir, dataset_name, get_win_rows(dataset_name, cutoff_results))
+        rows.append(summarize_cutoff(cutoff_results, dataset_name, cutoff))
+    return rows
+
+def write_sweep_summary(summary_file, models, rows):
+    """Writes the summary rows of all datasets and cutoffs, sorted by cutoff."""
+    with atomic_write(summary_file) as f:
+        output = csv.writer(f)
+        output.writerow(get_summary_columns(models))
+        output.writerows(sorted(rows, key = lambda row: row[0]))
@@ -0,0 +1,101 @@
+"""Typed NumPy arrays from SQLite query results
+
+fetch_columns reads a cursor with fetchmany, one chunk of rows at a time, and
+copies each chunk straight into preallocated NumPy arrays, one per result
+column. Only a chunk of Python row tuples exists at any time, instead of the
+whole result set as with fetchall, and numeric columns end up in contiguous
+int64/float64 arrays.
+
+Column dtypes are taken from the declared types of a table or view (see
+get_schema_dtypes) and otherwise inferred from the first chunk: INTEGER
+columns become int64, REAL/FLOAT/NUMERIC columns float64 (NULL becomes NaN)
+and text columns object arrays. An integer column that turns out to hold
+NULLs or reals is promoted to float64.
+
+"""
+from __future__ import division
+from collections import OrderedDict
+
+import numpy as np
+
+CHUNK_SIZE = 50000
+
+def get_declared_dtype(declared_type):
+    """Returns the NumPy dtype for a declared SQLite column type (following SQLite's affinity rules), or None."""
+    declared_type = declared_type.upper()
+    if 'INT' in declared_type:
+        return np.dtype(np.int64)
+    if any(text in declared_type for text in ('CHAR', 'CLOB', 'TEXT')):
+        return np.dtype(object)
+    if not declared_type or 'BLOB' in declared_type:
+        return None
+    return np.dtype(np.float64)
+
+def get_schema_dtypes(con, table):
+    """Returns {column: dtype} for the columns of a table or view with a usable declared type."""
+    dtypes = {}
+    for column_info in con.execute("""PRAGMA table_info(%s)""" % table):
+        dtype = get_declared_dtype(column_info[2])
+        if dtype is not None:
+            dtypes[str(column_info[1])] = dtype
+    return dtypes
+
+def infer_dtype(values):
+    """Infers the dtype of a column from a chunk of its values."""
+    kind = np.array(values).dtype.kind
+    if kind in 'iub':
+        return np.dtype(np.int64)
+    if kind == 'f':
+        return np.dtype(np.float64)
+    return np.dtype(object)
+
+def fetch_columns(cursor, dtypes = None, chunk_size = CHUNK_SIZE, size = None):
+    """Reads all remaining rows of an executed cursor into {column name: array}.
+
+    Keyword arguments:
+    dtypes  --  {column name: dtype} for some or all of the result columns (e.g., from get_schema_dtypes).
+    chunk_size  --  number of rows fetched at a time.
+    size  --  expected number of rows, if known, so the arrays are allocated once.
+
+    """
+    names = [description[0] for description in cursor.description]
+    # SQLite column names are case insensitive
+    dtypes = dict((name.lower(), dtype) for name, dtype in (dtypes or {}).items())
+    columns, n_rows = None, 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk = list(zip(*rows))
+        end = n_rows + len(rows)
+        if columns is None:
+            capacity = max(size or 0, end)
+            columns = [np.empty(capacity, dtype = dtypes.get(name.lower()) or infer_dtype(values))
+                       for name, values in zip(names, chunk)]
+        elif end > len(columns[0]):
+            capacity = max(end, 2 * len(columns[0]))
+            columns = [resize(column, n_rows, capacity) for column in columns]
+        for i, values in enumerate(chunk):
+            if columns[i].dtype.kind == 'i' and infer_dtype(values).kind != 'i':
+                columns[i] = resize(columns[i], n_rows, len(columns[i]), np.float64)
+            columns[i][n_rows:end] = values
+        n_rows = end
+    if columns is None:
+        columns = [np.empty(0, dtype = dtypes.get(name.lower()) or np.dtype(object)) for name in names]
+    return OrderedDict((name, column[:n_rows]) for name, column in zip(names, columns))
+
+def resize(column, n_rows, capacity, dtype = None):
+    """Returns a new array of the given capacity (and dtype) holding the first n_rows values of column."""
+    resized = np.empty(capacity, dtype = dtype or column.dtype)
+    resized[:n_rows] = column[:n_rows]
+    return resized
+
+def fetch_array(cursor, dtypes = None, chunk_size = CHUNK_SIZE, size = None):
+    """Reads all remaining rows of an executed cursor into a structured array (see fetch_columns)."""
+    columns = fetch_columns(cursor, dtypes, chunk_size, size)
+    return np.rec.fromarrays(list(columns.values()), names = [str(name) for name in columns])
+
+def query_columns(con, sql, parameters = (), table = None, **kwargs):
+    """Runs a query and returns its result as {column name: array}, with dtypes declared by table if given."""
+    dtypes = get_schema_dtypes(con, table) if table else None
+    return fetch_columns(con.execute(sql, parameters), dtypes, **kwargs)
@@ -0,0 +1,182 @@
+"""Exact neutral model likelihood from the Etienne (2005) sampling formula
+
+The probability of the abundances n_1, ..., n_S (J individuals in total) of a
+local community under neutral theory, with fundamental biodiversity number
+theta and immigration probability m, is (Etienne 2005, Ecology Letters 8:
+253-260)
+
+P = J! / (prod n_i * prod Phi_j!) * theta**S / (I)_J * sum_A K(D, A) * I**A / (theta)_A
+
+where Phi_j is the number of species with abundance j, I = m * (J - 1) / (1 - m)
+is the number of immigrants, (x)_n the rising factorial and A runs from S to J.
+K(D, A) depends only on the abundances: it is the coefficient of x**A in the
+product over species of
+
+T_n(x) = sum_a s(n, a) * s(a, 1) / s(n, 1) * x**a
+
+with s the unsigned Stirling numbers of the first kind. Everything is done in
+log space. The log coefficients of T_n are built with the recurrence
+
+log T_{n+1}[a] = logaddexp(log T_n[a], log T_n[a - 1] + log(a - 1) - log(n))
+
+and cached by abundance (see CACHE_MAX_COEFFICIENTS), and K(D, A) is computed
+once per site, so that each likelihood evaluation of the solver is a single
+sum over A. The products are exact log-space convolutions done in numpy
+blocks (see log_convolve), and the T_n of species sharing an abundance are
+multiplied by repeated squaring.
+
+The recurrence takes time proportional to the square of the largest
+abundance and the product to the square of N, so while sites with N in the
+thousands take a fraction of a second, sites with N around 10**5 take
+minutes.
+
+Note that this is the probability of the unlabelled abundances given J, not
+the product of per-species probabilities used for the other SAD models.
+
+"""
+from __future__ import division
+from collections import OrderedDict
+
+import numpy as np
+from scipy.special import gammaln, logit, expit, logsumexp
+
+# Log coefficients of T_n cached by abundance n, least recently used first.
+# Those of all abundances up to CACHE_ALL_BELOW are kept while they are
+# computed; larger ones only if they have been requested. Once the cache holds
+# more than CACHE_MAX_COEFFICIENTS coefficients the least recently used are
+# dropped, except those of n = 1 (to restart the recurrence from) and those
+# of the site being fitted.
+CACHE_ALL_BELOW = 1000
+CACHE_MAX_COEFFICIENTS = 5 * 10 ** 6
+LOG_T = OrderedDict([(1, np.array([-np.inf, 0.0]))])
+# Elements of the (rows x columns) blocks of log_convolve
+CONVOLVE_BLOCK_SIZE = 2 ** 20
+
+def next_log_T(n, log_T):
+    """Returns the log coefficients of T_{n+1} (indexed by a, from 0) from those of T_n."""
+    shifted = np.append(-np.inf, log_T)
+    shifted[2:] += np.log(np.arange(1, n + 1)) - np.log(n)
+    return np.logaddexp(np.append(log_T, -np.inf), shifted)
+
+def trim_cache(keep = ()):
+    """Drops the least recently used T_n, other than those in keep, until the cache is within CACHE_MAX_COEFFICIENTS."""
+    size = sum(len(log_T) for log_T in LOG_T.values())
+    for n in list(LOG_T):
+        if size <= CACHE_MAX_COEFFICIENTS:
+            break
+        if n != 1 and n not in keep:
+            size -= len(LOG_T.pop(n))
+
+def prepare_log_T(abundances):
+    """Computes and caches the log coefficients of T_n for each abundance n in abundances."""
+    abundances = set(int(n) for n in abundances)
+    needed = sorted(abundances - set(LOG_T))
+    if not needed:
+        return
+    # Continue the recurrence from the largest cached T_n below the smallest needed
+    n = max(cached for cached in LOG_T if cached < needed[0])
+    log_T = LOG_T[n]
+    remaining = set(needed)
+    while remaining:
+        log_T = next_log_T(n, log_T)
+        n += 1
+        if n <= CACHE_ALL_BELOW or n in remaining:
+            LOG_T[n] = log_T
+            remaining.discard(n)
+    trim_cache(abundances)
+
+def get_log_T(n):
+    """Returns the log coefficients of T_n (indexed by a, from 0)."""
+    if n not in LOG_T:
+        prepare_log_T([n])
+    log_T = LOG_T.pop(n)
+    LOG_T[n] = log_T
+    return log_T
+
+def log_convolve(x, y):
+    """Returns the log coefficients of the product of two polynomials given by their log coefficients.
+
+    Each block of rows of y is added to x in a skewed (rows x columns) array,
+    so that each column holds the terms of one coefficient of the product,
+    which are summed with logsumexp: exact in log space, with one numpy call
+    per block.
+
+    """
+    if len(y) > len(x):
+        x, y = y, x
+    size = len(x) + len(y) - 1
+    result = np.full(size, -np.inf)
+    rows = max(1, min(len(y), CONVOLVE_BLOCK_SIZE // (len(x) + len(y))))
+    for start in range(0, len(y), rows):
+        y_block = y[start:start + rows]
+        n_rows, width = len(y_block), len(x) + len(y_block) - 1
+        # Row j of the skewed array holds x + y_block[j] from column j on
+        skewed = np.full(n_rows * (width + 1), -np.inf)
+        skewed.reshape(n_rows, width + 1)[:, :len(x)] = x + y_block[:, None]
+        skewed = skewed[:n_rows * width].reshape(n_rows, width)
+        with np.errstate(invalid = 'ignore'):
+            block = logsumexp(skewed, axis = 0)
+        result[start:start + width] = np.logaddexp(result[start:start + width], block)
+    return result
+
+def log_power(log_T, count):
+    """Returns the log coefficients of a polynomial raised to the power count, by repeated squaring."""
+    power = None
+    while count:
+        if count & 1:
+            power = log_T if power is None else log_convolve(power, log_T)
+        count >>= 1
+        if count:
+            log_T = log_convolve(log_T, log_T)
+    return power
+
+def etienne_log_K(stats):
+    """Returns log K(D, A) of a site's SiteStats for A = S, ..., N (indexed by A - S)."""
+    prepare_log_T(stats.values)
+    log_K = np.array([0.0])
+    for value, count in zip(stats.values, stats.counts):
+        # T_n without its (zero) constant term, so that the product starts at A = S
+        log_K = log_convolve(log_K, log_power(get_log_T(int(value))[1:], int(count)))
+    return log_K
+
+def etienne_constant(stats):
+    """Returns the part of the log-likelihood that does not depend on theta and m."""
+    return (gammaln(stats.N + 1) - np.sum(stats.counts * np.log(stats.values))
+            - np.sum(gammaln(stats.counts + 1)))
+
+def etienne_ll_stats(stats, theta, m, log_K = None):
+    """Log-likelihood of the neutral model with parameters theta and m from a site's SiteStats."""
+    if log_K is None:
+        log_K = etienne_log_K(stats)
+    J, S = stats.N, stats.S
+    A = np.arange(S, J + 1)
+    if m >= 1:
+        # No dispersal limitation: the Ewens sampling formula
+        return etienne_constant(stats) + S * np.log(theta) - (gammaln(theta + J) - gammaln(theta))
+    I = m * (J - 1) / (1 - m)
+    return (etienne_constant(stats) + S * np.log(theta) - (gammaln(I + J) - gammaln(I))
+            + logsumexp(log_K + A * np.log(I) - (gammaln(theta + A) - gammaln(theta))))
+
+def ewens_theta(S, N):
+    """Returns the estimate of theta without dispersal limitation, which solves S = sum_i theta / (theta + i)."""
+    from scipy.optimize import brentq
+    i = np.arange(N)
+    return np.exp(brentq(lambda log_theta: np.sum(np.exp(log_theta) / (np.exp(log_theta) + i)) - S,
+                         np.log(1e-8), np.log(1e8)))
+
+def etienne_solver_stats(stats, log_K = None):
+    """MLE of the neutral model parameters theta and m from a site's SiteStats."""
+    from scipy import optimize
+    if log_K is None:
+        log_K = etienne_log_K(stats)
+    theta0 = ewens_theta(stats.S, stats.N)
+    def neutral_func(x):
+        return -etienne_ll_stats(stats, np.exp(x[0]), expit(x[1]), log_K)
+    ll, pars = [], []
+    for m0 in [0.1, 0.5, 0.9]:
+        log_theta, logit_m = optimize.fmin_l_bfgs_b(neutral_func, x0 = [np.log(theta0), logit(m0)], approx_grad = True,
+                                                    bounds = [(np.log(1e-8), np.log(1e8)), (-30, 30)])[0]
+        pars.append((np.exp(log_theta), expit(logit_m)))
+        ll.append(-neutral_func([log_theta, logit_m]))
+    theta, m = pars[int(np.nanargmax(ll))]
+    return theta, m
@@ -0,0 +1,180 @@
+"""Declarative figures for the results databases of the sad-comparison project
+
+Each figure is described by a spec, a dictionary with the figure 'kind', the
+output 'filename' and the options of that kind:
+
+wins  --  bar chart of the number of sites won by each model, summed over
+          'datasets' (all datasets if None).
+wins_by_dataset  --  one wins bar chart per dataset; 'panels' is a list of
+          (dataset_code, label, color) and 'shape' the (rows, columns) grid.
+histogram  --  overlaid histograms of one 'value_type'; 'series' is a list of
+          (model_name, color, alpha, label) drawn in that order, restricted
+          to 'datasets' (all datasets if None), with 'bins', 'range',
+          'xlabel' and an optional 'legend' location.
+one_to_one  --  per-site rescaled values of 'value_type' of each model in
+          'panels', a list of (model_name, color), against 'reference'.
+
+MODEL_STYLES and VALUE_TYPE_FIGURES describe the histograms of each value type
+shared by the graphing scripts (see get_value_type_figures).
+
+load_figure_data runs the queries (see sad_graph_data) needed by a list of
+specs, fetching each value type only once, and make_figure draws one spec.
+get_figure_jobs turns the specs into render jobs for sad_render, each with
+only the data its figure uses, so unchanged figures are not redrawn.
+
+"""
+from __future__ import division
+from collections import OrderedDict
+import os
+
+from sad_render import render_job
+import matplotlib.pyplot as plt
+import numpy as np
+
+from sad_graph_data import (get_win_counts, get_values, select_values, get_site_values)
+
+# Models in plotting order (model code order, see sad_results_db.MODEL_NAMES):
+# name in the database, color and legend label
+MODEL_STYLES = [('Logseries', 'magenta', 'Logseries'),
+                ('Poisson lognormal', 'teal', 'Poisson lognormal'),
+                ('Negative binomial', 'gray', 'Negative binomial'),
+                ('Zipf distribution', 'orange', 'Zipf distribution'),
+                ('Geometric series', 'olivedrab', 'Geometric'),
+                ('METE truncated logseries', 'sienna', 'METE logseries')]
+
+# Value types: histogram bins and range, axis label, legend location, and the
+# file names of the combined figure and of each model's figure (in MODEL_STYLES order)
+VALUE_TYPE_FIGURES = [('AICc weight', 50, (0, 1), 'AICc weights', 'upper right', 'AICc_weights.png',
+                       ['Logseries_weights.png', 'Poisson_lognormal_weights.png', 'Negative_binomial_weights.png',
+                        'Zipf_weights.png', 'Geometric_weights.png', 'METE_weights.png']),
+                      ('likelihood', range(-750, 0, 10), None, 'log-likelihoods', 'upper left', 'likelihoods.png',
+                       ['logseries_likelihoods.png', 'pln_likelihoods.png', 'neg_bin_likelihoods.png',
+                        'Zipf_likelihoods.png', 'geometric_likelihoods.png', 'mete_likelihoods.png']),
+                      ('relative likelihood', 50, (0, 1), 'relative likelihoods', 'upper right', 'relative_likelihoods.png',
+                       ['logseries_relative.png', 'pln_relative.png', 'neg_bin_relative.png',
+                        'zipf_relative.png', 'geometric_relative.png', 'mete_relative.png'])]
+
+def overlay_series(value_type):
+    """Series of a combined histogram; weights are drawn from the logseries up, the others from the last model down."""
+    if value_type == 'AICc weight':
+        return [(model, color, 1 if model == 'Logseries' else .7, label) for model, color, label in MODEL_STYLES]
+    return [(model, color, .4 if model == 'Logseries' else .7, label) for model, color, label in reversed(MODEL_STYLES)]
+
+def get_value_type_figures():
+    """Returns the specs of the combined and per-model histograms of each value type in VALUE_TYPE_FIGURES."""
+    figures = []
+    for value_type, bins, value_range, xlabel, legend, combined_file, model_files in VALUE_TYPE_FIGURES:
+        histogram = {'kind': 'histogram', 'value_type': value_type, 'bins': bins, 'range': value_range}
+        figures.append(dict(histogram, filename = combined_file, xlabel = xlabel[0].upper() + xlabel[1:],
+                            legend = legend, series = overlay_series(value_type)))
+        for (model, color, label), model_file in zip(MODEL_STYLES, model_files):
+            figures.append(dict(histogram, filename = model_file, xlabel = label + " " + xlabel,
+                                series = [(model, color, 1 if model == 'Logseries' else .7, label)]))
+    return figures
+
+def get_data_key(spec):
+    """Returns the key of the query results a figure spec is drawn from."""
+    if spec['kind'] in ('wins', 'wins_by_dataset'):
+        return 'wins'
+    if spec['kind'] == 'one_to_one':
+        return ('sites', spec['value_type'])
+    return spec['value_type']
+
+def load_figure_data(con, figures):
+    """Returns the query results needed to draw a list of figure specs."""
+    data = {}
+    for spec in figures:
+        key = get_data_key(spec)
+        if key in data:
+            continue
+        if key == 'wins':
+            data[key] = get_win_counts(con)
+        elif spec['kind'] == 'one_to_one':
+            data[key] = get_site_values(con, spec['value_type'])
+        else:
+            data[key] = get_values(con, spec['value_type'])
+    return data
+
+def get_figure_data(spec, data):
+    """Returns the part of the query results that a figure spec uses."""
+    key = get_data_key(spec)
+    figure_data = data[key]
+    if spec['kind'] == 'histogram' and spec.get('datasets') is not None:
+        figure_data = OrderedDict((partition, values) for partition, values in figure_data.items()
+                                  if partition[0] in spec['datasets'])
+    return {key: figure_data}
+
+def sum_wins(win_counts, datasets = None):
+    """Sums the wins of each model over datasets (all datasets if None)."""
+    wins = OrderedDict()
+    for (dataset, model), count in win_counts.items():
+        if datasets is None or dataset in datasets:
+            wins[model] = wins.get(model, 0) + count
+    return wins
+
+def plot_wins(spec, data):
+    """Bar chart of the total wins of each model."""
+    wins = sum_wins(data['wins'], spec.get('datasets'))
+    x = np.arange(1, len(wins) + 1)
+    width = 1
+    plt.bar(x, list(wins.values()), width, color = spec.get('color', 'grey'))
+    plt.ylabel('Number of Wins')
+    plt.xticks(x + width/2.0, list(wins.keys()), fontsize = 'small')
+    plt.xlabel('Species abundance distribution models')
+
+def plot_wins_by_dataset(spec, data):
+    """Grid of wins bar charts, one per dataset."""
+    rows, columns = spec['shape']
+    for i, (dataset, label, color) in enumerate(spec['panels']):
+        plt.subplot(rows, columns, i + 1)
+        wins = sum_wins(data['wins'], [dataset])
+        x = np.arange(1, len(wins) + 1)
+        width = 1
+        plt.bar(x, list(wins.values()), width, color = color)
+        plt.yticks(fontsize = 'x-small')
+        plt.ylabel('Wins', fontsize = 'small')
+        plt.xticks(x + width/2.0, list(wins.keys()), fontsize = 'x-small', rotation = 15, horizontalalignment = 'right')
+        plt.xlabel(label)
+    plt.tight_layout()
+
+def plot_histogram(spec, data):
+    """Overlaid histograms of one value type for several models."""
+    partitions = data[spec['value_type']]
+    for model, color, alpha, label in spec['series']:
+        plt.hist(select_values(partitions, model, spec.get('datasets')), spec['bins'], range = spec.get('range'),
+                 facecolor = color, histtype = "stepfilled", alpha = alpha, label = label)
+    if spec.get('legend'):
+        plt.legend(loc = spec['legend'], fontsize = 11)
+    plt.xlabel(spec['xlabel'])
+    plt.ylabel("Frequency")
+    plt.tight_layout()
+
+def plot_one_to_one(spec, data):
+    """1:1 plots of each model's rescaled per-site values against those of the reference model."""
+    site_values = data[('sites', spec['value_type'])]
+    rescaled = -1 * np.log(-1 * site_values)
+    for i, (model, color) in enumerate(spec['panels']):
+        plt.subplot(2, 2, i + 1)
+        if model in rescaled:
+            plt.plot(rescaled[spec['reference']], rescaled[model], 'o', color = color)
+        plt.plot([-7, 0], [-7, 0], 'k-', linewidth = 2)
+        plt.ylabel(model + " likelihood")
+    plt.xlabel("Log-series likelihood")
+
+RENDERERS = {'wins': plot_wins,
+             'wins_by_dataset': plot_wins_by_dataset,
+             'histogram': plot_histogram,
+             'one_to_one': plot_one_to_one}
+
+def make_figure(spec, data, output_dir):
+    """Draws one figure spec from the data returned by load_figure_data and saves it to output_dir."""
+    plt.figure()
+    RENDERERS[spec['kind']](spec, data)
+    plt.savefig(os.path.join(output_dir, spec['filename']), format = "png")
+    plt.close()
+
+def get_figure_jobs(figures, data, output_dir):
+    """Returns a sad_render job for each figure spec."""
+    return [render_job(os.path.join(output_dir, spec['filename']), make_figure,
+                       (spec, get_figure_data(spec, data), output_dir))
+            for spec in figures]
@@ -0,0 +1,69 @@
+"""Query layer for graphing the results databases of the sad-comparison project
+
+Works against any database with the ResultsWin and RawResults tables or views
+(SummarizedResults.sqlite as built by sad_results_db, or older databases such
+as UlrichOllik2003.sqlite). Each value type is fetched with a single query and
+returned as NumPy arrays partitioned by dataset and model:
+
+{(dataset_code, model_name): array of values}
+
+with the partitions in dataset and model code order. Query results are read
+into typed arrays with sad_db_arrays rather than lists of row tuples.
+
+"""
+from __future__ import division
+from collections import OrderedDict
+
+import numpy as np
+from pandas import DataFrame, pivot_table
+
+from sad_db_arrays import query_columns
+
+def get_win_counts(con):
+    """Returns the number of sites won by each model in each dataset as {(dataset_code, model_name): wins}.
+    
+    Unlike the value partitions these are in model and then dataset order.
+    
+    """
+    columns = query_columns(con, """SELECT dataset_code, model_name, COUNT(*) AS wins FROM ResultsWin
+                                    GROUP BY dataset_code, model_code
+                                    ORDER BY model_code, dataset_code""", table = 'ResultsWin')
+    return OrderedDict(zip(zip(columns['dataset_code'], columns['model_name']), columns['wins']))
+
+def get_values(con, value_type):
+    """Returns all non-null values of one value type, partitioned by dataset and model."""
+    columns = query_columns(con, """SELECT dataset_code, model_name, value FROM RawResults
+                                    WHERE value_type = ? AND value IS NOT NULL
+                                    ORDER BY dataset_code, model_code, value""", (value_type, ), table = 'RawResults')
+    return partition(columns['dataset_code'], columns['model_name'], np.asarray(columns['value'], dtype = float))
+
+def partition(datasets, models, values):
+    """Splits values, sorted by dataset and model, into {(dataset_code, model_name): values}."""
+    if not len(values):
+        return OrderedDict()
+    changes = (datasets[1:] != datasets[:-1]) | (models[1:] != models[:-1])
+    starts = np.flatnonzero(np.concatenate(([True], changes)))
+    ends = np.append(starts[1:], len(values))
+    return OrderedDict(((datasets[start], models[start]), values[start:end])
+                       for start, end in zip(starts, ends))
+
+def select_values(partitions, model_name, datasets = None):
+    """Returns the values of one model, for the given datasets or for all datasets if datasets is None."""
+    selected = [values for (dataset, model), values in partitions.items()
+                if model == model_name and (datasets is None or dataset in datasets)]
+    return np.concatenate(selected) if selected else np.array([])
+
+def get_site_values(con, value_type):
+    """Returns a DataFrame of one value type with a row per dataset and site and a column per model."""
+    data = DataFrame(query_columns(con, """SELECT dataset_code, site, model_name, value FROM RawResults
+                                           WHERE value_type = ?""", (value_type, ), table = 'RawResults'))
+    return pivot_table(data, values = 'value', index = ['dataset_code', 'site'], columns = ['model_name'])
+
+def get_percent_null(con, value_type):
+    """Returns the percentage of sites with a null value for each dataset and model that has any."""
+    return DataFrame(query_columns(con, """SELECT dataset_code, model_name,
+                                                  100.0 * SUM(value IS NULL) / COUNT(*) AS percent_null
+                                           FROM RawResults
+                                           WHERE value_type = ?
+                                           GROUP BY dataset_code, model_code
+                                           HAVING percent_null > 0""", (value_type, ), table = 'RawResults'))
@@ -0,0 +1,69 @@
+"""Cached map geometry and site coordinates for the site maps
+
+Building a Basemap reads and projects the coastline and continent polygons at
+the requested resolution, which dominates the time needed to draw a map. The
+projected Basemap is pickled once per projection and resolution, so later maps
+draw the coastlines and continents from the cached geometry.
+
+Site coordinates are read from the <dataset>_lat_long.csv files once and kept
+in binary <dataset>_lat_long.npy files, which are rebuilt whenever the csv file
+is newer. project_sites transforms the sites of all datasets in one call.
+basemap itself is only imported once a map is built.
+
+"""
+from __future__ import division
+import cPickle as pickle
+import os
+
+import numpy as np
+
+from sad_comparison_functions import atomic_write
+
+BASEMAP_CACHE_EXT = '_basemap.pickle'
+LATLONG_EXT = '_lat_long.csv'
+LATLONG_CACHE_EXT = '_lat_long.npy'
+
+def get_basemap_cache_path(cache_dir, projection, resolution, lon_0):
+    """Returns the path of the cached Basemap for a projection, resolution and central longitude."""
+    from mpl_toolkits import basemap
+    return os.path.join(cache_dir, '%s_%s_%s_%s%s' % (projection, resolution, lon_0, basemap.__version__,
+                                                       BASEMAP_CACHE_EXT))
+
+def get_basemap(projection, cache_dir, resolution = 'i', lon_0 = 0):
+    """Returns a Basemap centered on lon_0, unpickled from cache_dir if it has been built before."""
+    cache_file = get_basemap_cache_path(cache_dir, projection, resolution, lon_0)
+    if os.path.exists(cache_file):
+        with open(cache_file, 'rb') as f:
+            return pickle.load(f)
+    from mpl_toolkits import basemap
+    map = basemap.Basemap(projection = projection, lon_0 = lon_0, resolution = resolution)
+    with atomic_write(cache_file) as f:
+        pickle.dump(map, f, pickle.HIGHEST_PROTOCOL)
+    return map
+
+def import_latlong_data(input_filename):
+    """Imports the lat and long columns of a site coordinates csv file."""
+    # atleast_1d keeps a file with a single site one-dimensional
+    return np.atleast_1d(np.genfromtxt(input_filename, dtype = "f8,f8", names = ['lat', 'long'], delimiter = ","))
+
+def load_site_coordinates(data_dir, dataset):
+    """Returns a dataset's site coordinates, from its binary cache unless the csv file is newer."""
+    csv_file = os.path.join(data_dir, dataset + LATLONG_EXT)
+    cache_file = os.path.join(data_dir, dataset + LATLONG_CACHE_EXT)
+    if os.path.exists(cache_file) and os.path.getmtime(cache_file) >= os.path.getmtime(csv_file):
+        return np.load(cache_file)
+    coordinates = import_latlong_data(csv_file)
+    try:
+        with atomic_write(cache_file) as f:
+            np.save(f, coordinates)
+    except (IOError, OSError):
+        pass # Another map being drawn at the same time is writing the same cache
+    return coordinates
+
+def project_sites(map, data_dir, datasets):
+    """Returns the projected (x, y) site coordinates of each dataset, all transformed at once."""
+    coordinates = [load_site_coordinates(data_dir, dataset) for dataset in datasets]
+    x, y = map(np.concatenate([sites['long'] for sites in coordinates]),
+               np.concatenate([sites['lat'] for sites in coordinates]))
+    ends = np.cumsum([len(sites) for sites in coordinates])[:-1]
+    return zip(np.split(x, ends), np.split(y, ends))
@@ -0,0 +1,91 @@
+"""Vectorized AICc based model selection for the sad-comparison project
+
+All functions work on a whole (sites x models) matrix of log-likelihoods at
+once. Models whose fit failed for a site should be given a NaN log-likelihood;
+they receive NaN AICc values and weights and, with renormalize (the default),
+the remaining models for that site are weighted among themselves. Without it
+a site with any failed fit gets NaN weights for all models.
+
+"""
+from __future__ import division
+from collections import namedtuple
+import numpy as np
+
+ModelSelection = namedtuple('ModelSelection', ['AICc', 'delta_AICc', 'weights', 'relative_likelihoods'])
+
+def AICc(k, L, n):
+    """Computes the corrected Akaike Information Criterion (as macroecotools.AICc).
+
+    k, L and n are broadcast against each other, so k can be a vector with one
+    value per model, L a (sites x models) matrix and n a column of one value
+    per site. AICc is NaN where n <= k + 1.
+
+    """
+    k = np.asarray(k, dtype = float)
+    L = np.asarray(L, dtype = float)
+    n = np.asarray(n, dtype = float)
+    with np.errstate(divide = 'ignore', invalid = 'ignore'):
+        correction = 2 * k * (k + 1) / (n - k - 1)
+    aicc = 2 * k - 2 * L + correction
+    return np.where(n - k - 1 > 0, aicc, np.nan)
+
+def akaike_weights(ic, renormalize = True):
+    """Returns the differences from the best model and the weights for a (sites x models) matrix of AICc values.
+
+    Based on Burnham and Anderson (2002). The differences are taken from each
+    row's minimum, so the exponentials never overflow and the largest term in
+    each row is exactly 1. NaN values are left out of their row's weights if
+    renormalize, and otherwise make the whole row NaN.
+
+    """
+    ic = np.atleast_2d(np.asarray(ic, dtype = float))
+    valid = ~np.isnan(ic)
+    if not renormalize:
+        valid &= valid.all(axis = 1)[:, None]
+    ic_min = np.min(np.where(valid, ic, np.inf), axis = 1)[:, None]
+    with np.errstate(invalid = 'ignore'):
+        delta = ic - ic_min
+        relative_likelihoods = np.where(valid, np.exp(-delta / 2), 0)
+        weights = relative_likelihoods / relative_likelihoods.sum(axis = 1)[:, None]
+    weights[~valid] = np.nan
+    return delta, weights
+
+def model_selection(L, k, S, cutoff = 4, renormalize = True):
+    """AICc, delta AICc, AICc weights and relative likelihoods for a matrix of log-likelihoods.
+
+    Keyword arguments:
+    L  --  (sites x models) matrix of log-likelihoods.
+    k  --  number of fitted parameters for each model.
+    S  --  number of observations (species richness) at each site.
+    cutoff  --  minimum number of observations required to generate weights
+                (as in macroecotools.aic_weight); other sites get NaN weights.
+    renormalize  --  weight the models of a site with failed fits among the
+                     others (see akaike_weights); otherwise its weights are NaN.
+
+    The relative likelihoods are the weights the models would receive if they all
+    had the same number of parameters, i.e. normalized likelihoods.
+
+    """
+    L = np.atleast_2d(np.asarray(L, dtype = float))
+    S = np.asarray(S, dtype = float).reshape(-1, 1)
+    aicc = AICc(k, L, S)
+    delta_aicc, weights = akaike_weights(aicc, renormalize)
+    _, relative_likelihoods = akaike_weights(-2 * L, renormalize)
+    too_small = S[:, 0] < cutoff
+    weights[too_small] = np.nan
+    relative_likelihoods[too_small] = np.nan
+    return ModelSelection(aicc, delta_aicc, weights, relative_likelihoods)
+
+def best_models(weights):
+    """Returns the column index and weight of the best model in each row of a (sites x models) weight matrix.
+
+    Ties go to the first of the tied models in column order. NaN weights are
+    ignored; rows without any valid weight get index -1 and a NaN weight.
+
+    """
+    weights = np.atleast_2d(np.asarray(weights, dtype = float))
+    valid = ~np.isnan(weights)
+    has_valid = valid.any(axis = 1)
+    best = np.argmax(np.where(valid, weights, -np.inf), axis = 1)
+    best_weights = weights[np.arange(len(weights)), best]
+    return np.where(has_valid, best, -1), np.where(has_valid, best_weights, np.nan)
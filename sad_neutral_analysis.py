@@ -2,25 +2,32 @@
 
 Conducts analyses in Connolly et al. 2014 (in PNAS) using ~17,000 empirical SADS
 
+python sad_neutral_analysis.py [--neutral] [--processes N]
+
+--neutral also fits the neutral model itself to each site with the exact
+Etienne sampling formula (see sad_etienne).
+
+The functions can be imported without running the analysis; matplotlib,
+seaborn, basemap and sad_preston (with scipy.stats and scipy.integrate) are
+only imported by the functions that draw figures.
+
 """
 
 from __future__ import division
 
-import os
-import glob
+import argparse
 import functools
+import os
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
 
-from mpl_toolkits.axes_grid.inset_locator import inset_axes
-from mpl_toolkits.basemap import Basemap
+from sad_comparison_functions import get_par_multi_dists, get_single_site_stats
+from sad_neutral_comparison import update_comparison, get_llik_stats
 
-from macroecotools import AICc, aic_weight, preston_sad, hist_pmf
-from macroeco_distributions import pln, nbinom_lower_trunc
-from sad_comparison_functions import get_par_multi_dists, get_loglik_multi_dists
+DATA_DIR = './sad-data/chapter3/'
+DATASETS = ['Actinopterygii', 'Amphibia', 'Arachnida', 'bbs', 'cbc', 'Coleoptera',
+            'fia', 'gentry', 'mcdb', 'naba', 'Reptilia']
 
 def get_dataset_name(pathname):
     """Extract dataset name from file path
@@ -49,34 +56,20 @@ def import_abundance(datafile):
     raw_data = np.genfromtxt(datafile, dtype = "S15,i8,S50,i8", names = ['site','year','sp','ab'], delimiter = ",",comments = "#")
     return raw_data
 
-def import_latlong_data(input_filename, comments='#'):
-    data = np.genfromtxt(input_filename, dtype = "f8,f8",
-                         names = ['lat','long'], delimiter = ",")
-    return data
-
 def filter_data_minS(data, minS):
     """Only keep data with S>=minS for analysis"""
     return data.groupby(['dataset', 'site_ID']).filter(lambda x: len(x) >= minS)
 
 def get_llik(abundances, dist):
-    """Get the loglikelihood for a given distribution and set of data"""
-    paras = get_par_multi_dists(abundances, dist)
-    if paras:
-        llik = get_loglik_multi_dists(abundances, dist, *paras)
-    else:
-        llik = None
-    return llik
-
-def get_pln_aicc_wgts(sads):
-    """Get the AICc weight"""
-    min_aiccs = sads[['negbin_aicc', 'pln_aicc']].min(axis=1)
-    negbin_delta_aicc = sads['negbin_aicc'] - min_aiccs
-    pln_delta_aicc = sads['pln_aicc'] - min_aiccs
-    pln_rel_lik = np.exp(-(pln_delta_aicc) / 2)
-    negbin_rel_lik = np.exp(-(negbin_delta_aicc) / 2)
-    return pln_rel_lik / (pln_rel_lik + negbin_rel_lik)
+    """Get the loglikelihood for a given distribution and set of data (NaN if the fit fails)"""
+    return get_llik_stats(get_single_site_stats(abundances), dist)
+
+get_negbin_llik = functools.partial(get_llik, dist='negbin')
+get_pln_llik = functools.partial(get_llik, dist='pln')
 
 def make_hist_empir_model(datasets, analysis_ext, data_dir, fig_ext):
+    import matplotlib.pyplot as plt
+    from sad_preston import preston_hists
     plt.figure()
     for i, dataset in enumerate (datasets):
         datafile = datafile = data_dir + dataset + analysis_ext
@@ -95,15 +88,10 @@ def make_hist_empir_model(datasets, analysis_ext, data_dir, fig_ext):
             if S > 15:                     
                 #Graphing code
                 """Make a histogram comparing the two models to the empirical data"""
-                xs = range(1, max(abunds) * 2)
-                pln_paras = get_par_multi_dists(abunds, 'pln') + (1,) #add truncation at 1
+                # Model mass per Preston bin from the survival functions at the bin edges
+                pln_paras = get_par_multi_dists(abunds, 'pln') #truncated at 1
                 negbin_paras = get_par_multi_dists(abunds, 'negbin')
-                pln_pmf = pln.pmf(xs, *pln_paras)
-                negbin_pmf = nbinom_lower_trunc.pmf(xs, *negbin_paras)
-                hist_empir, hist_bins = preston_sad(abunds)
-                hist_empir = hist_empir / sum(hist_empir)
-                hist_pln, _ = hist_pmf(xs, pln_pmf, hist_bins)
-                hist_negbin, _ = hist_pmf(xs, negbin_pmf, hist_bins)
+                hist_bins, hist_empir, hist_pln, hist_negbin = preston_hists(abunds, pln_paras, negbin_paras)
                 hist_bins_log = np.log2(hist_bins)
                 xticks = hist_bins_log[:-1] + 0.5
                 xvalues =  [int(np.exp2(val)) for val in hist_bins_log[:-1]]
@@ -130,30 +118,29 @@ def make_hist_empir_model(datasets, analysis_ext, data_dir, fig_ext):
  
     output_file =  data_dir + fig_ext 
     plt.savefig(output_file, dpi=250) 
-    plt.show()
     plt.close()    
 
 
+MAP_DATASETS = ['bbs', 'cbc', 'fia', 'naba', 'mcdb', 'gentry' ] # The rest of the data do not have lat-longs.
+MAP_DATA_DIR = './sad-data/chapter1/'
+MAP_CACHE_DIR = DATA_DIR
+
 #Mapping code modified from White et al. 2012
-def map_sites(projection, output_file):
+def map_sites(projection, output_file, datasets = MAP_DATASETS, data_dir = MAP_DATA_DIR):
     """Generate a world map with sites color-coded by database"""
-    map = Basemap(projection=projection,lon_0=0,resolution='i') #Sets up map for Mollweide projection- chosen for equal area properties.
+    import matplotlib.pyplot as plt
+    from sad_maps import get_basemap, project_sites
+    map = get_basemap(projection, MAP_CACHE_DIR, resolution='i', lon_0=0) #Projected coastlines are cached per projection
 
     map.drawcoastlines(linewidth = .10)
     map.fillcontinents(color='black',lake_color='white')
 
-    datasets = ['bbs', 'cbc', 'fia', 'naba', 'mcdb', 'gentry' ] # The rest of the data do not have lat-longs.
-    data_dir = './sad-data/chapter1/'
     markers=['o', '^', 's','D','v', 'p']
     markersizes=3
     colors=["teal", 'c', "seagreen", "m", "gold", 'palegreen']
 
 
-    for i, dataset in enumerate(datasets):
-        latlong_data = import_latlong_data(data_dir + dataset + '_lat_long.csv')
-        lats = latlong_data["lat"]
-        longs = latlong_data["long"]
-        x,y = map(longs,lats)
+    for i, (x, y) in enumerate(project_sites(map, data_dir, datasets)):
         map.plot(x,y, ls='', marker=markers[i], markeredgecolor= colors[i],
         markeredgewidth=0.5, markersize=markersizes, fillstyle='none')
 
@@ -175,66 +162,85 @@ def map_sites(projection, output_file):
     plt.savefig(output_file, dpi=250)
     plt.close()
 
-get_negbin_llik = functools.partial(get_llik, dist='negbin')
-get_pln_llik = functools.partial(get_llik, dist='pln')
+def plot_distabclasses_vs_lognormwgt(sads, output_file):
+    """Create figure similar to figure 2b in the Connolly 2014 paper."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_style("whitegrid")
+    ax = sns.lmplot('log_distinct_ab_vals', 'pln_aicc_wgt', data=sads, col='dataset', col_wrap=4,
+                    hue='dataset', fit_reg=False)
+    ax.set(xlabel="Distinct Abundance Values (log)", ylabel="AICc weight for log-normal")
+    ax.set(xlim=[np.log(5), np.log(300)], ylim=[0, 1])
+    xticks = [10, 20, 50, 100, 200]
+    ax.set(xticks=np.log(xticks))
+    ax.set(xticklabels=xticks)
+    ax.savefig(output_file)
+    plt.close()
+
+def plot_avgvals_by_dataset(sads_by_dataset, output_file):
+    """Create figure showing average values for each datasets"""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    sns.set_style("whitegrid")
+    ax = sns.lmplot('log_distinct_ab_vals', 'pln_aicc_wgt', data=sads_by_dataset,
+                    hue='dataset', fit_reg=False, scatter_kws={"s": 60, "alpha": 1})
+    ax.set(xlabel="Distinct Abundance Values (log)", ylabel="AICc weight for log-normal")
+    ax.set(xlim=[np.log(5), np.log(300)], ylim=[0, 1])
+    xticks = [10, 20, 50, 100, 200]
+    ax.set(xticks=np.log(xticks))
+    ax.set(xticklabels=xticks)
+    ax.savefig(output_file)
+    plt.close()
 
-if os.path.isfile('./sad-data/chapter3/distribution_data.csv'):
-    sads = pd.read_csv('./sad-data/chapter3/distribution_data.csv')
-else:
-    datasets = ['Actinopterygii', 'Amphibia', 'Arachnida', 'bbs', 'cbc', 'Coleoptera',
-                'fia', 'gentry', 'mcdb', 'naba', 'Reptilia']
-    data = import_data(datasets, './sad-data/chapter3/')
+def main():
+    parser = argparse.ArgumentParser(description='Compare neutral and Poisson lognormal SADs across sites.')
+    parser.add_argument('--neutral', action='store_true',
+                        help='also fit the neutral model with the Etienne sampling formula')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='number of worker processes fitting sites (all cores by default)')
+    parser.add_argument('--force', action='store_true',
+                        help='redraw all figures, even those the render cache has as up to date')
+    args = parser.parse_args()
+
+    # Selects the Agg backend before any figure is drawn
+    from sad_render import render_job, render_figures, RENDER_CACHE
+    import sad_comparison_functions
+    import sad_maps
+    import sad_preston
+
+    data = import_data(DATASETS, DATA_DIR)
     data = filter_data_minS(data, minS=5)
 
-    data_by_dataset_site = data.groupby(['dataset', 'site_ID'])
-    sads = data_by_dataset_site.count()
-    sads.rename(columns={'abundance': 'richness'}, inplace=True)
-    sads['distinct_ab_vals'] = data_by_dataset_site['abundance'].nunique()
-    sads['negbin_llik'] = data_by_dataset_site.agg(get_negbin_llik)
-    sads['pln_llik'] = data_by_dataset_site.agg(get_pln_llik)
-    sads['negbin_aicc'] = AICc(k=2, L=sads['negbin_llik'], n=sads['richness'])
-    sads['pln_aicc'] = AICc(k=2, L=sads['pln_llik'], n=sads['richness'])
-    sads['pln_aicc_wgt'] = get_pln_aicc_wgts(sads)
-    sads.reset_index(inplace=True)
-    sads.to_csv('./sad-data/chapter3/distribution_data.csv', index=False)
-
-# Create figure similar to figure 2b in the Connolly 2014 paper.
-sads = sads.dropna()
-sads['log_distinct_ab_vals'] = np.log(sads['distinct_ab_vals'])
-sns.set_style("whitegrid")
-ax = sns.lmplot('log_distinct_ab_vals', 'pln_aicc_wgt', data=sads, col='dataset', col_wrap=4,
-                hue='dataset', fit_reg=False)
-ax.set(xlabel="Distinct Abundance Values (log)", ylabel="AICc weight for log-normal")
-ax.set(xlim=[np.log(5), np.log(300)], ylim=[0, 1])
-xticks = [10, 20, 50, 100, 200]
-ax.set(xticks=np.log(xticks))
-ax.set(xticklabels=xticks)
-ax.savefig('./sad-data/chapter3/distabclasses_vs_lognormwgt.png')
-plt.close()
-
-# Create figure showing average values for each datasets
-sads_by_dataset = sads.groupby('dataset').mean().reset_index()
-ax = sns.lmplot('log_distinct_ab_vals', 'pln_aicc_wgt', data=sads_by_dataset,
-                hue='dataset', fit_reg=False, scatter_kws={"s": 60, "alpha": 1})
-ax.set(xlabel="Distinct Abundance Values (log)", ylabel="AICc weight for log-normal")
-ax.set(xlim=[np.log(5), np.log(300)], ylim=[0, 1])
-xticks = [10, 20, 50, 100, 200]
-ax.set(xticks=np.log(xticks))
-ax.set(xticklabels=xticks)
-ax.savefig('./sad-data/chapter3/avgvals_by_dataset.png')
-plt.show()
-plt.close()
-
-# Create map of sites
-map_sites('moll', './sad-data/chapter3/partial_sites_map.png') #Mollweide projection, for publication
-map_sites('robin', './sad-data/chapter3/presentation_map.png') #Robinson projection, for presentation
-
-#Create histograms of empirical vs. model SADs
-datasets = ['Actinopterygii', 'Amphibia', 'Arachnida', 'bbs', 'cbc', 'Coleoptera',
-                'fia', 'gentry', 'mcdb', 'naba', 'Reptilia']
-
-analysis_ext = '_spab.csv'
-data_dir = './sad-data/chapter3/'
-fig_ext = 'EmpirModelHist.png'
-
-make_hist_empir_model(datasets, analysis_ext, data_dir, fig_ext) 
+    # Negative binomial and Poisson lognormal fitted in a pool of worker processes,
+    # only for the sites that are new or changed since distribution_data.csv was written
+    sads = update_comparison(data, DATA_DIR + 'distribution_data.csv', processes=args.processes,
+                             neutral=args.neutral)
+
+    # A failed neutral fit (--neutral) leaves the site's negbin and pln comparison valid
+    sads = sads.dropna(subset=['negbin_llik', 'pln_llik'])
+    sads['log_distinct_ab_vals'] = np.log(sads['distinct_ab_vals'])
+    sads_by_dataset = sads.groupby('dataset').mean().reset_index()
+
+    #Create histograms of empirical vs. model SADs
+    analysis_ext = '_spab.csv'
+    fig_ext = 'EmpirModelHist.png'
+
+    map_inputs = [MAP_DATA_DIR + dataset + '_lat_long.csv' for dataset in MAP_DATASETS]
+    figures = [render_job(DATA_DIR + 'distabclasses_vs_lognormwgt.png', plot_distabclasses_vs_lognormwgt,
+                          (sads, DATA_DIR + 'distabclasses_vs_lognormwgt.png')),
+               render_job(DATA_DIR + 'avgvals_by_dataset.png', plot_avgvals_by_dataset,
+                          (sads_by_dataset, DATA_DIR + 'avgvals_by_dataset.png')),
+               # Create map of sites
+               render_job(DATA_DIR + 'partial_sites_map.png', map_sites, #Mollweide projection, for publication
+                          ('moll', DATA_DIR + 'partial_sites_map.png'), map_inputs, [sad_maps]),
+               render_job(DATA_DIR + 'presentation_map.png', map_sites, #Robinson projection, for presentation
+                          ('robin', DATA_DIR + 'presentation_map.png'), map_inputs, [sad_maps]),
+               render_job(DATA_DIR + fig_ext, make_hist_empir_model, (DATASETS, analysis_ext, DATA_DIR, fig_ext),
+                          [DATA_DIR + dataset + analysis_ext for dataset in DATASETS],
+                          [sad_preston, sad_comparison_functions])]
+
+    # Figures are drawn in parallel and only if their inputs or code changed since the last run
+    render_figures(figures, os.path.join(DATA_DIR, RENDER_CACHE), force=args.force)
+
+if __name__ == '__main__':
+    main()
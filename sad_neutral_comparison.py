@@ -0,0 +1,215 @@
+"""Batched comparison of the neutral (negative binomial) and Poisson lognormal SADs
+
+Chapter 3 compares the negative binomial predicted by neutral theory with the
+Poisson lognormal at every site of every dataset (Connolly et al. 2014). The
+SiteStats of all SADs are computed in one vectorized pass, both models are
+fitted to each site in a pool of worker processes (which read the SiteStats
+from shared memory maps, see sad_shared_data), and the results are
+returned as one table with a row per (dataset, site_ID):
+
+dataset, site_ID, richness, distinct_ab_vals, negbin_llik, pln_llik,
+negbin_aicc, pln_aicc, pln_aicc_wgt
+
+With neutral = True the neutral model itself is also fitted to each site with
+the exact Etienne sampling formula (see sad_etienne), adding the neutral_llik,
+neutral_theta and neutral_m columns. Its likelihood is that of the unlabelled
+abundances, so it is reported alongside the AICc comparison rather than in it.
+
+update_comparison keeps this table up to date incrementally. A manifest next
+to it records the content hash of each site's abundances and the
+SOLVER_VERSION its models were fitted with, so only new, changed or outdated
+sites are refitted, and sites that are no longer in the data are dropped.
+
+"""
+from __future__ import division
+from collections import OrderedDict
+import csv
+import functools
+import multiprocessing
+import os
+
+import numpy as np
+from pandas import DataFrame, read_csv
+
+from sad_comparison_functions import (get_site_stats, get_site_hash, get_par_site_stats,
+                                      get_loglik_site_stats, atomic_write)
+from sad_etienne import etienne_log_K, etienne_solver_stats, etienne_ll_stats
+from sad_shared_data import shared_pool, get_shared_site_stats
+from sad_model_selection import model_selection
+
+# Models in column order, with their number of fitted parameters
+NEUTRAL_MODELS = [('negbin', 2), ('pln', 2)]
+LLIK_COLUMNS = [dist + '_llik' for dist, k in NEUTRAL_MODELS]
+# Fit of the neutral model itself (see sad_etienne)
+ETIENNE_COLUMNS = ['neutral_llik', 'neutral_theta', 'neutral_m']
+
+# Increase whenever a change to the solvers or likelihoods changes the fits,
+# so that cached fits from earlier versions are refitted
+SOLVER_VERSION = 3
+
+def get_sad_stats(data):
+    """Returns the (dataset, site_ID) of each SAD in a DataFrame of abundances, and their SiteStats in the same order."""
+    grouped = data.groupby(['dataset', 'site_ID'])
+    raw_data = np.zeros(len(data), dtype = [('site', 'i8'), ('ab', 'i8')])
+    raw_data['site'] = grouped.ngroup().values
+    raw_data['ab'] = data['abundance'].values
+    return list(grouped.size().index), get_site_stats(raw_data)
+
+def get_fit_columns(neutral = False):
+    """Returns the names of the fitted values of each site, in the order returned by fit_sad."""
+    return LLIK_COLUMNS + (ETIENNE_COLUMNS if neutral else [])
+
+def get_llik_stats(stats, dist):
+    """Returns the log-likelihood of dist fitted to one site, or NaN if the fit fails."""
+    try:
+        paras = get_par_site_stats(stats, dist)
+        return get_loglik_site_stats(stats, dist, *paras) if paras else np.nan
+    except Exception as error:
+        print("Warning: %s fit of site %s failed: %r" % (dist, stats.site, error))
+        return np.nan
+
+def get_etienne_fit(stats):
+    """Returns the log-likelihood, theta and m of the Etienne sampling formula fitted to one site (NaN if the fit fails)."""
+    try:
+        log_K = etienne_log_K(stats)
+        theta, m = etienne_solver_stats(stats, log_K)
+        return [etienne_ll_stats(stats, theta, m, log_K), theta, m]
+    except Exception as error:
+        print("Warning: neutral fit of site %s failed: %r" % (stats.site, error))
+        return [np.nan] * len(ETIENNE_COLUMNS)
+
+def fit_sad(stats, neutral = False):
+    """Fits each neutral comparison model to one site, returning their log-likelihoods (NaN if a fit fails).
+
+    If neutral is True the log-likelihood and parameters of the Etienne
+    sampling formula follow. A failed fit only affects its own values, so
+    one bad site never loses the rest of a batch.
+
+    """
+    fits = [get_llik_stats(stats, dist) for dist, k in NEUTRAL_MODELS]
+    if neutral:
+        fits += get_etienne_fit(stats)
+    return fits
+
+def fit_shared_sad(site_slice, neutral = False):
+    """Fits the models to the site of a SiteSlice in a shared_pool (see fit_sad)."""
+    return fit_sad(get_shared_site_stats(site_slice), neutral)
+
+def fit_sads(site_stats, processes = None, neutral = False):
+    """Returns a (sites x fitted values) array (see get_fit_columns), fitting the sites in a pool of worker processes.
+
+    processes is the number of workers (all cores if None); with 1 the sites
+    are fitted in this process.
+
+    """
+    processes = min(processes or multiprocessing.cpu_count(), max(len(site_stats), 1))
+    if processes > 1:
+        with shared_pool(site_stats, processes) as (pool, slices):
+            fits = pool.map(functools.partial(fit_shared_sad, neutral = neutral), slices,
+                            chunksize = len(site_stats) // (4 * processes) + 1)
+    else:
+        fits = [fit_sad(stats, neutral) for stats in site_stats]
+    return np.array(fits, dtype = float).reshape(-1, len(get_fit_columns(neutral)))
+
+def get_comparison_table(keys, site_stats, fits):
+    """Returns the comparison table from the SAD keys, their SiteStats and their fitted values."""
+    richness = np.array([stats.S for stats in site_stats], dtype = int)
+    # A site where either fit failed gets a NaN weight rather than 1 for the other model
+    selection = model_selection(fits[:, :len(NEUTRAL_MODELS)], k = [k for dist, k in NEUTRAL_MODELS], S = richness,
+                                renormalize = False)
+    table = DataFrame(OrderedDict([('dataset', [dataset for dataset, site in keys]),
+                                   ('site_ID', [site for dataset, site in keys]),
+                                   ('richness', richness),
+                                   ('distinct_ab_vals', [len(stats.values) for stats in site_stats]),
+                                   ('negbin_llik', fits[:, 0]),
+                                   ('pln_llik', fits[:, 1]),
+                                   ('negbin_aicc', selection.AICc[:, 0]),
+                                   ('pln_aicc', selection.AICc[:, 1]),
+                                   ('pln_aicc_wgt', selection.weights[:, 1])]))
+    if fits.shape[1] > len(NEUTRAL_MODELS):
+        for i, column in enumerate(ETIENNE_COLUMNS):
+            table[column] = fits[:, len(NEUTRAL_MODELS) + i]
+    return table
+
+def compare_sads(data, processes = None, neutral = False):
+    """Returns the comparison table of the SADs in a DataFrame with dataset, site_ID and abundance columns."""
+    keys, site_stats = get_sad_stats(data)
+    return get_comparison_table(keys, site_stats, fit_sads(site_stats, processes, neutral))
+
+def get_manifest_path(output_file):
+    """Returns the path of the manifest of a comparison table."""
+    return os.path.splitext(output_file)[0] + '_manifest.csv'
+
+def read_manifest(manifest_file):
+    """Reads a comparison manifest into {(dataset, site_ID): (content hash, solver version)}."""
+    with open(manifest_file, 'rb') as f:
+        reader = csv.reader(f)
+        next(reader)
+        return dict(((dataset, site), (site_hash, int(version))) for dataset, site, site_hash, version in reader)
+
+def write_manifest(manifest_file, keys, hashes):
+    """Writes the content hash of each (dataset, site_ID) and the current SOLVER_VERSION to a manifest."""
+    with atomic_write(manifest_file) as f:
+        output = csv.writer(f)
+        output.writerow(['dataset', 'site_ID', 'hash', 'solver_version'])
+        output.writerows((dataset, site, site_hash, SOLVER_VERSION) for (dataset, site), site_hash in zip(keys, hashes))
+
+def read_cached_fits(output_file, columns = LLIK_COLUMNS):
+    """Reads the cached fits of a comparison table and its manifest.
+
+    Returns {(dataset, site_ID): (content hash, values of columns)} of the
+    sites fitted with the current SOLVER_VERSION, and {(dataset, site_ID):
+    content hash} of all sites in the manifest. Datasets and site IDs are
+    strings, as in the manifest. A table without a manifest, or without some
+    of the columns, is not trusted.
+
+    """
+    manifest_file = get_manifest_path(output_file)
+    if not (os.path.exists(output_file) and os.path.exists(manifest_file)):
+        return {}, {}
+    manifest = read_manifest(manifest_file)
+    hashes = dict((key, site_hash) for key, (site_hash, version) in manifest.items())
+    previous = read_csv(output_file, dtype = {'dataset': str, 'site_ID': str})
+    if not set(columns) <= set(previous.columns):
+        return {}, hashes
+    cached = {}
+    for row in zip(previous['dataset'], previous['site_ID'], *[previous[column] for column in columns]):
+        site_hash, version = manifest.get(row[:2], (None, None))
+        if site_hash is not None and version == SOLVER_VERSION:
+            cached[row[:2]] = (site_hash, row[2:])
+    return cached, hashes
+
+def update_comparison(data, output_file, processes = None, neutral = False):
+    """Writes the comparison table of the SADs in data to output_file, refitting only the sites that are stale.
+
+    A site is refitted if it is new, its abundances have changed or it was
+    fitted with an older SOLVER_VERSION. Cached sites that are no longer in
+    the data are reported and dropped. With neutral = True the neutral model
+    is fitted as well (see fit_sad). Returns the table.
+
+    """
+    keys, site_stats = get_sad_stats(data)
+    hashes = [get_site_hash(stats) for stats in site_stats]
+    columns = get_fit_columns(neutral)
+    cached, previous_hashes = read_cached_fits(output_file, columns)
+    str_keys = [(str(dataset), str(site)) for dataset, site in keys]
+
+    fits = np.empty((len(keys), len(columns)))
+    stale = []
+    for i, (key, site_hash) in enumerate(zip(str_keys, hashes)):
+        if key in cached and cached[key][0] == site_hash:
+            fits[i] = cached[key][1]
+        else:
+            stale.append(i)
+    removed = sorted(set(previous_hashes) - set(str_keys))
+    if removed:
+        print("Warning: dropping %s cached sites that are no longer in the data, e.g. %s" % (len(removed), removed[0]))
+    print("Fitting %s of %s sites (%s cached)" % (len(stale), len(keys), len(keys) - len(stale)))
+    if stale:
+        fits[stale] = fit_sads([site_stats[i] for i in stale], processes, neutral)
+
+    table = get_comparison_table(keys, site_stats, fits)
+    with atomic_write(output_file) as f:
+        table.to_csv(f, index = False)
+    write_manifest(get_manifest_path(output_file), str_keys, hashes)
+    return table
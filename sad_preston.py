@@ -0,0 +1,72 @@
+"""Preston octave histograms of fitted abundance distributions
+
+The model mass in each Preston bin [2**i, 2**(i+1)) is the difference of the
+model's survival function at the bin edges, so a histogram takes one
+evaluation per bin edge instead of one pmf evaluation per abundance up to
+twice the largest abundance. As in np.histogram, which bins the empirical
+abundances, the last bin is closed.
+
+The survival function of the Poisson lognormal at k is the lognormal mixture
+of Poisson survival functions,
+
+P(X > k) = integral of N(t; mu, sigma) * P(k + 1, exp(t)) dt
+
+(P being the regularized lower incomplete gamma function), a single smooth
+integral with a break point at log(k + 1), where the Poisson survival
+function steps from 0 to 1.
+
+"""
+from __future__ import division
+
+import numpy as np
+from scipy import integrate
+from scipy.special import gammainc
+import scipy.stats.distributions as sd
+
+# Half width of the integration interval, in standard deviations of log(lambda)
+PLN_SIGMAS = 10
+
+def get_preston_bins(abunds):
+    """Returns the Preston bin edges (powers of 2 up to twice the largest abundance), as in macroecotools.preston_sad."""
+    edges = np.exp2(np.arange(25))
+    return edges[edges <= max(abunds) * 2]
+
+def get_sf_points(bins):
+    """Returns the abundances at which the survival function bounds the Preston bins (the last bin is closed)."""
+    points = np.asarray(bins) - 1
+    points[-1] += 1
+    return points
+
+def pln_untrunc_sf(k, mu, sigma):
+    """Survival function P(X > k) of the (untruncated) Poisson lognormal at each abundance in k."""
+    lower, upper = mu - PLN_SIGMAS * sigma, mu + PLN_SIGMAS * sigma
+    norm = 1 / (sigma * np.sqrt(2 * np.pi))
+    sf = []
+    for k_i in np.atleast_1d(k):
+        integrand = lambda t: norm * np.exp(-((t - mu) / sigma) ** 2 / 2) * gammainc(k_i + 1, np.exp(t))
+        step = np.log(k_i + 1)
+        points = [step] if lower < step < upper else None
+        sf.append(integrate.quad(integrand, lower, upper, points = points, limit = 200)[0])
+    return np.array(sf)
+
+def pln_hist(bins, mu, sigma, lower_trunc = True):
+    """Returns the Poisson lognormal mass in each Preston bin."""
+    sf = pln_untrunc_sf(np.append(get_sf_points(bins), 0), mu, sigma)
+    hist = sf[:-2] - sf[1:-1]
+    return hist / sf[-1] if lower_trunc else hist
+
+def negbin_hist(bins, n, p):
+    """Returns the lower truncated negative binomial mass in each Preston bin."""
+    sf = sd.nbinom.sf(get_sf_points(bins), n, p)
+    return (sf[:-1] - sf[1:]) / sd.nbinom.sf(0, n, p)
+
+def preston_hists(abunds, pln_paras, negbin_paras):
+    """Returns the Preston bins and the empirical, Poisson lognormal and negative binomial histograms of a site.
+
+    The empirical histogram is normalized to proportions of species.
+
+    """
+    bins = get_preston_bins(abunds)
+    hist_empir = np.histogram(abunds, bins = bins)[0]
+    hist_empir = hist_empir / sum(hist_empir)
+    return bins, hist_empir, pln_hist(bins, *pln_paras), negbin_hist(bins, *negbin_paras)
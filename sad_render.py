@@ -0,0 +1,128 @@
+"""Headless, parallel figure rendering with a render cache
+
+Importing this module selects matplotlib's non-interactive Agg backend, so it
+has to be imported before matplotlib.pyplot.
+
+A render job is a (filename, function, args, inputs, code) tuple (see
+render_job): function(*args) draws the figure and saves it to filename,
+inputs lists the data files it reads and code the other modules (or
+functions) that draw it. Each job is keyed on a hash of RENDER_VERSION, the
+matplotlib version, the source of the function's module and of code, the
+arguments and the contents of the input files. render_figures draws the jobs
+in a pool of worker processes and records the keys in a cache file, so on the
+next run figures whose key is unchanged (and whose file still exists) are
+skipped, unless force is given.
+
+"""
+from __future__ import division
+from collections import namedtuple
+import hashlib
+import inspect
+import json
+import multiprocessing
+import os
+import sys
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+from pandas import DataFrame, Series
+
+from sad_comparison_functions import atomic_write
+
+RENDER_CACHE = 'render_cache.json'
+# Increase to redraw all figures, e.g., after a change the keys do not cover
+RENDER_VERSION = 1
+
+RenderJob = namedtuple('RenderJob', ['filename', 'function', 'args', 'inputs', 'code'])
+
+def render_job(filename, function, args, inputs = (), code = ()):
+    """Returns a render job that draws filename with function(*args), reading the files in inputs.
+    
+    code lists the modules or functions outside function's own module that
+    the figure is drawn with, so that changing them redraws it.
+    
+    """
+    return RenderJob(filename, function, tuple(args), tuple(inputs), tuple(code))
+
+def update_hash(sha, obj):
+    """Adds an object (nested containers of arrays, DataFrames and plain values) to a hash."""
+    if isinstance(obj, np.ndarray):
+        sha.update(str(obj.dtype) + str(obj.shape))
+        sha.update(obj.tobytes() if obj.dtype != object else repr(obj.tolist()))
+    elif isinstance(obj, (DataFrame, Series)):
+        sha.update(repr(list(obj.index)))
+        update_hash(sha, obj.values)
+        if isinstance(obj, DataFrame):
+            sha.update(repr(list(obj.columns)))
+    elif isinstance(obj, dict):
+        items = obj.items() if type(obj) is not dict else sorted(obj.items())
+        for key, value in items:
+            sha.update(repr(key))
+            update_hash(sha, value)
+    elif isinstance(obj, (list, tuple)):
+        sha.update('%s%s' % (type(obj).__name__, len(obj)))
+        for value in obj:
+            update_hash(sha, value)
+    else:
+        sha.update(repr(obj))
+
+def get_job_key(job):
+    """Returns the hash of a render job's code, arguments and input files."""
+    sha = hashlib.sha1()
+    sha.update('%s %s' % (RENDER_VERSION, matplotlib.__version__))
+    sha.update(job.function.__module__ + '.' + job.function.__name__)
+    # The whole module, so that the helpers the function calls (e.g., the
+    # renderers of sad_figures.make_figure) are covered as well
+    for code in (sys.modules[job.function.__module__], ) + job.code:
+        sha.update(inspect.getsource(code))
+    update_hash(sha, job.args)
+    for input_file in job.inputs:
+        with open(input_file, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+    return sha.hexdigest()
+
+def read_render_cache(cache_file):
+    """Reads the {filename: key} render cache, empty if there is none."""
+    if not os.path.exists(cache_file):
+        return {}
+    with open(cache_file, 'rb') as f:
+        return json.load(f)
+
+def write_render_cache(cache_file, cache):
+    with atomic_write(cache_file) as f:
+        json.dump(cache, f, indent = 1, sort_keys = True)
+
+def run_job(job):
+    """Draws one render job (in a worker process) and returns its filename."""
+    job.function(*job.args)
+    return job.filename
+
+def render_figures(jobs, cache_file, processes = None, force = False):
+    """Draws the render jobs whose figures are missing or out of date, returning the number drawn.
+
+    processes is the number of worker processes (all cores if None); with 1
+    the figures are drawn in this process. If force is True all figures are
+    drawn.
+
+    """
+    cache = read_render_cache(cache_file)
+    keys = dict((job.filename, get_job_key(job)) for job in jobs)
+    stale = [job for job in jobs
+             if force or cache.get(job.filename) != keys[job.filename] or not os.path.exists(job.filename)]
+    print("Rendering %s of %s figures" % (len(stale), len(jobs)))
+    if not stale:
+        return 0
+    processes = min(processes or multiprocessing.cpu_count(), len(stale))
+    pool = multiprocessing.Pool(processes) if processes > 1 else None
+    try:
+        rendered = pool.imap_unordered(run_job, stale) if pool is not None else (run_job(job) for job in stale)
+        # Record each figure as soon as it is saved, so an error keeps the finished ones
+        for filename in rendered:
+            cache[filename] = keys[filename]
+    finally:
+        if pool is not None:
+            pool.terminate()
+        write_render_cache(cache_file, cache)
+    return len(stale)
@@ -0,0 +1,233 @@
+"""SQLite results database for the sad-comparison project
+
+Schema:
+Models, ValueTypes  --  integer codes for the model names and value types.
+SiteResults  --  one wide row per dataset and site with the AICc weight,
+                 log-likelihood and relative likelihood of every model (see
+                 SITE_VALUE_COLUMNS).
+Wins  --  the winning model of each site, indexed on (dataset_code, model_code).
+WinSummary, WeightHistogram  --  materialized summaries (wins per dataset and
+                 model and 50-bin AICc weight histograms), refreshed for each
+                 dataset whenever it is loaded.
+
+ResultsWin and RawResults are views over Wins and SiteResults with the
+columns of the original tables (RawResults unpivots SiteResults into one row
+per site, model and value type), so existing queries keep working.
+
+Each dataset is loaded with executemany inside a single transaction. The rows
+of a dataset are built directly from its results DataFrame, as returned by
+sad-comparisons.py's model_comparisons or read from the results store (see
+load_results).
+
+"""
+from __future__ import division
+import csv
+import os
+import sqlite3 as dbapi
+import time
+
+from sad_comparison_functions import atomic_write, MODELS, CLOSED_FORM_MODELS
+from sad_model_selection import best_models
+
+# Pragmas for bulk loading: write-ahead logging lets readers work while a load
+# is running and only needs an fsync at checkpoints, not at every commit.
+PRAGMAS = ['PRAGMA journal_mode = WAL',
+           'PRAGMA synchronous = NORMAL',
+           'PRAGMA temp_store = MEMORY',
+           'PRAGMA cache_size = -65536']
+
+MODEL_NAMES = {0: 'Logseries', 1: 'Poisson lognormal', 2: 'Negative binomial', 3: 'Zipf distribution',
+               4: 'Geometric series', 5: 'METE truncated logseries'}
+
+# Suffix of the results columns of each model, in model code order
+MODEL_COLUMNS = MODELS + CLOSED_FORM_MODELS
+
+# Value types and the prefix of the results columns holding each of them
+VALUE_TYPES = {0: ('AICc weight', 'AICc_'),
+               1: ('likelihood', 'likelihood_'),
+               2: ('relative likelihood', 'relative_ll_')}
+VALUE_PREFIXES = [prefix for code, (name, prefix) in sorted(VALUE_TYPES.items())]
+
+# Value columns of SiteResults, named as in the results DataFrame
+SITE_VALUE_COLUMNS = [prefix + model for prefix in VALUE_PREFIXES for model in MODEL_COLUMNS]
+SITE_COLUMNS = ['dataset_code', 'site', 'S', 'N'] + SITE_VALUE_COLUMNS
+
+WEIGHT_HISTOGRAM_BINS = 50
+
+PROCESSED_EXT = '_processed_results.csv'
+
+TABLES = ['Models', 'ValueTypes', 'SiteResults', 'Wins', 'WinSummary', 'WeightHistogram']
+VIEWS = ['ResultsWin', 'RawResults']
+
+def connect(database):
+    """Opens the results database with the pragmas used for bulk loading."""
+    con = dbapi.connect(database)
+    # Switch con data type to string
+    con.text_factory = str
+    for pragma in PRAGMAS:
+        con.execute(pragma)
+    return con
+
+def create_schema(con, rebuild = False):
+    """Creates the results tables, indexes and views, dropping any existing ones first if rebuild is True."""
+    legacy_tables = con.execute("""SELECT name FROM sqlite_master
+                                   WHERE type = 'table' AND name IN ('ResultsWin', 'RawResults')""").fetchall()
+    site_columns = [column[1] for column in con.execute("""PRAGMA table_info(SiteResults)""")]
+    if (legacy_tables or site_columns and site_columns != SITE_COLUMNS) and not rebuild:
+        raise ValueError("Database has results tables of an older layout; it needs to be rebuilt.")
+    with con:
+        if rebuild:
+            for (table, ) in legacy_tables:
+                con.execute("""DROP TABLE IF EXISTS %s""" % table)
+            for view in VIEWS:
+                con.execute("""DROP VIEW IF EXISTS %s""" % view)
+            for table in TABLES:
+                con.execute("""DROP TABLE IF EXISTS %s""" % table)
+        con.execute("""CREATE TABLE IF NOT EXISTS Models
+                       (model_code INTEGER PRIMARY KEY,
+                        model_name TEXT UNIQUE)""")
+        con.execute("""CREATE TABLE IF NOT EXISTS ValueTypes
+                       (value_type_code INTEGER PRIMARY KEY,
+                        value_type TEXT UNIQUE)""")
+        con.executemany("""INSERT OR REPLACE INTO Models VALUES(?,?)""", sorted(MODEL_NAMES.items()))
+        con.executemany("""INSERT OR REPLACE INTO ValueTypes VALUES(?,?)""",
+                        [(code, name) for code, (name, column) in sorted(VALUE_TYPES.items())])
+        con.execute("""CREATE TABLE IF NOT EXISTS SiteResults
+                       (dataset_code TEXT,
+                        site TEXT,
+                        S INTEGER,
+                        N INTEGER,
+                        %s,
+                        PRIMARY KEY (dataset_code, site))""" %
+                    ",\n".join("%s FLOAT" % column for column in SITE_VALUE_COLUMNS))
+        con.execute("""CREATE TABLE IF NOT EXISTS Wins
+                       (dataset_code TEXT,
+                        site TEXT,
+                        S INTEGER,
+                        N INTEGER,
+                        model_code INTEGER,
+                        AICc_weight_model FLOAT,
+                        PRIMARY KEY (dataset_code, site))""")
+        con.execute("""CREATE INDEX IF NOT EXISTS Wins_dataset_model
+                       ON Wins (dataset_code, model_code, AICc_weight_model)""")
+        con.execute("""CREATE TABLE IF NOT EXISTS WinSummary
+                       (dataset_code TEXT,
+                        model_code INTEGER,
+                        wins INTEGER,
+                        PRIMARY KEY (dataset_code, model_code))""")
+        con.execute("""CREATE TABLE IF NOT EXISTS WeightHistogram
+                       (dataset_code TEXT,
+                        model_code INTEGER,
+                        bin INTEGER,
+                        sites INTEGER,
+                        PRIMARY KEY (dataset_code, model_code, bin))""")
+        con.execute("""CREATE VIEW IF NOT EXISTS ResultsWin AS
+                       SELECT dataset_code, site, S, N, model_code, model_name, AICc_weight_model
+                       FROM Wins JOIN Models USING (model_code)""")
+        raw_results = ["""SELECT dataset_code, site, S, N, %s AS model_code, '%s' AS model_name,
+                                 '%s' AS value_type, %s AS value
+                          FROM SiteResults""" % (model_code, MODEL_NAMES[model_code], name, prefix + model)
+                       for code, (name, prefix) in sorted(VALUE_TYPES.items())
+                       for model_code, model in enumerate(MODEL_COLUMNS)]
+        con.execute("""CREATE VIEW IF NOT EXISTS RawResults AS %s""" % " UNION ALL ".join(raw_results))
+
+def refresh_summaries(con, dataset_name):
+    """Recomputes the materialized summary tables for one dataset (within the caller's transaction)."""
+    con.execute("""DELETE FROM WinSummary WHERE dataset_code = ?""", (dataset_name, ))
+    con.execute("""INSERT INTO WinSummary
+                   SELECT dataset_code, model_code, COUNT(*) FROM Wins
+                   WHERE dataset_code = ?
+                   GROUP BY model_code""", (dataset_name, ))
+    con.execute("""DELETE FROM WeightHistogram WHERE dataset_code = ?""", (dataset_name, ))
+    for model_code, model in enumerate(MODEL_COLUMNS):
+        con.execute("""INSERT INTO WeightHistogram
+                       SELECT dataset_code, ?,
+                              MIN(CAST(AICc_%s * ? AS INTEGER), ? - 1) AS bin, COUNT(*)
+                       FROM SiteResults
+                       WHERE dataset_code = ? AND AICc_%s IS NOT NULL
+                       GROUP BY bin""" % (model, model),
+                    (model_code, WEIGHT_HISTOGRAM_BINS, WEIGHT_HISTOGRAM_BINS, dataset_name))
+
+def load_dataset(con, dataset_name, win_rows, site_rows):
+    """Replaces the results of one dataset in a single transaction and refreshes its summaries.
+
+    win_rows are (dataset_code, site, S, N, model_code, AICc_weight_model) and
+    site_rows have the SITE_COLUMNS. Either can be any iterable (e.g., a
+    generator), so rows are streamed into the database rather than collected
+    first. Returns the number of rows loaded.
+
+    """
+    start = time.time()
+    with con:
+        cur = con.cursor()
+        cur.execute("""DELETE FROM Wins WHERE dataset_code = ?""", (dataset_name, ))
+        cur.execute("""DELETE FROM SiteResults WHERE dataset_code = ?""", (dataset_name, ))
+        cur.executemany("""INSERT INTO Wins VALUES(?,?,?,?,?,?)""", win_rows)
+        n_rows = cur.rowcount
+        cur.executemany("""INSERT INTO SiteResults VALUES(%s)""" % ",".join("?" * len(SITE_COLUMNS)), site_rows)
+        n_rows += cur.rowcount
+        refresh_summaries(con, dataset_name)
+    elapsed = time.time() - start
+    print("%s: loaded %s rows in %.2f s (%.0f rows/sec)" % (dataset_name, n_rows, elapsed,
+                                                           n_rows / max(elapsed, 1e-9)))
+    return n_rows
+
+def get_value_columns(results, prefix):
+    """Returns the results columns starting with prefix; their order is the model code order."""
+    return [column for column in results.columns if column.startswith(prefix)]
+
+def get_win_rows(dataset_name, results):
+    """Returns the Wins rows of a results DataFrame.
+
+    The winner of each site is the model with the largest AICc weight (see
+    sad_model_selection.best_models). Sites without any valid weight, e.g.,
+    because every fit failed, have no winner and are left out.
+
+    """
+    model_codes, weights = best_models(results[get_value_columns(results, 'AICc_')].values)
+    has_winner = model_codes >= 0
+    columns = [[dataset_name] * int(has_winner.sum())]
+    columns += [results[column].values[has_winner].tolist() for column in ('site', 'S', 'N')]
+    columns += [model_codes[has_winner].tolist(), weights[has_winner].tolist()]
+    return zip(*columns)
+
+def get_site_rows(dataset_name, results):
+    """Returns the SiteResults rows of a results DataFrame, one per site.
+    
+    Models missing from the results (e.g., in a store written before they
+    were added) are NULL.
+    
+    """
+    columns = [[dataset_name] * len(results)]
+    columns += [results[column].values.tolist() for column in ('site', 'S', 'N')]
+    columns += [results[column].values.tolist() if column in results else [None] * len(results)
+                for column in SITE_VALUE_COLUMNS]
+    return zip(*columns)
+
+def write_processed_results(data_dir, dataset_name, win_rows):
+    """Writes the winning model of each site to the dataset's _processed_results.csv file."""
+    with atomic_write(os.path.join(data_dir, dataset_name + PROCESSED_EXT)) as f:
+        output = csv.writer(f)
+        output.writerow(["# " + ", ".join("%s = %s" % model for model in sorted(MODEL_NAMES.items()))])
+        output.writerow(['dataset', 'site', 'S', 'N', 'model_code', 'model_name', 'AICc_weight'])
+        output.writerows(row[:5] + (MODEL_NAMES[row[4]], ) + row[5:] for row in win_rows)
+
+def load_results(con, dataset_name, results, data_dir = None):
+    """Loads a results DataFrame into the database, also writing _processed_results.csv to data_dir if given."""
+    win_rows = get_win_rows(dataset_name, results)
+    if data_dir is not None:
+        write_processed_results(data_dir, dataset_name, win_rows)
+    return load_dataset(con, dataset_name, win_rows, get_site_rows(dataset_name, results))
+
+def insert_results(con, dataset_name, results):
+    """Adds or replaces the rows of some of a dataset's sites, without refreshing its summaries.
+
+    Used to load batches of sites while a dataset is still being fitted; the
+    final load_results call replaces the whole dataset and its summaries.
+
+    """
+    with con:
+        con.executemany("""INSERT OR REPLACE INTO Wins VALUES(?,?,?,?,?,?)""",
+                        get_win_rows(dataset_name, results))
+        con.executemany("""INSERT OR REPLACE INTO SiteResults VALUES(%s)""" % ",".join("?" * len(SITE_COLUMNS)),
+                        get_site_rows(dataset_name, results))
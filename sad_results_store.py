@@ -0,0 +1,74 @@
+"""Columnar results store for the sad-comparison project
+
+The model comparison results for each dataset are kept in a single compressed
+NumPy archive, <dataset>_results.npz, holding one typed array per column
+(site, S, N, the AICc weights, log-likelihoods and relative likelihoods of each
+model and the fitted parameters). The csv files written by earlier versions of
+sad-comparisons.py are views of this table and can be regenerated on demand:
+
+python sad_results_store.py /path/to/data_dir bbs fia ...
+
+"""
+from __future__ import division
+from collections import OrderedDict
+import os
+import sys
+
+import numpy as np
+from pandas import DataFrame
+
+from sad_comparison_functions import atomic_write
+
+STORE_EXT = '_results.npz'
+
+# Legacy csv outputs and the prefixes of the value columns each one contains
+LEGACY_FILES = [('_dist_test.csv', ('AICc_', )),
+                ('_likelihoods.csv', ('likelihood_', )),
+                ('_relative_L.csv', ('relative_ll_', )),
+                ('_likelihood_results.csv', ('AICc_', 'likelihood_', 'relative_ll_'))]
+
+def get_store_path(data_dir, dataset_name):
+    """Returns the path of the results store for a dataset."""
+    return os.path.join(data_dir, dataset_name + STORE_EXT)
+
+def write_results_store(filename, results):
+    """Atomically writes a results DataFrame to a compressed columnar store."""
+    columns = list(results.columns)
+    arrays = {}
+    for column in columns:
+        if column == 'site':
+            arrays[column] = np.array(results[column].values.tolist(), dtype = str)
+        elif column in ('S', 'N'):
+            arrays[column] = results[column].values.astype(np.int64)
+        else:
+            arrays[column] = results[column].values.astype(np.float64)
+    with atomic_write(filename) as f:
+        np.savez_compressed(f, __columns__ = np.array(columns), **arrays)
+
+def read_results_store(filename):
+    """Reads a results store into a DataFrame with the columns in their stored order."""
+    with np.load(filename) as data:
+        columns = [str(column) for column in data['__columns__']]
+        return DataFrame(OrderedDict((column, data[column]) for column in columns))
+
+def get_legacy_view(results, prefixes):
+    """Returns the site, S, N and value columns of the results that start with any of prefixes."""
+    value_columns = [column for column in results.columns if column.startswith(prefixes)]
+    return results[['site', 'S', 'N'] + value_columns]
+
+def export_legacy_csvs(data_dir, dataset_name, results = None):
+    """Writes the legacy _dist_test, _likelihoods, _relative_L and _likelihood_results csv files.
+
+    If results is not given it is read from the dataset's results store.
+
+    """
+    if results is None:
+        results = read_results_store(get_store_path(data_dir, dataset_name))
+    for ext, prefixes in LEGACY_FILES:
+        with atomic_write(os.path.join(data_dir, dataset_name + ext)) as f:
+            get_legacy_view(results, prefixes).to_csv(f, index = False)
+
+if __name__ == '__main__':
+    data_dir = sys.argv[1]
+    for dataset in sys.argv[2:]:
+        export_legacy_csvs(data_dir, dataset)
@@ -0,0 +1,108 @@
+"""Cost-aware scheduling of site fits
+
+Fitting times vary by orders of magnitude between sites: a small MCDB site
+fits instantly, while a CBC circle with hundreds of species and huge
+abundances dominates the Poisson lognormal. Handing sites to a pool in site
+order (or in fixed chunks) leaves a few workers finishing the largest sites
+long after the others have gone idle.
+
+The fitting time of a site is predicted with a log-linear model of its
+richness, total and maximum abundance and number of distinct abundances,
+calibrated by least squares on the timings of earlier runs (TIMINGS_FILE in
+the data directory; DEFAULT_COEFFICIENTS until there are MIN_TIMINGS of them).
+schedule_fits hands the sites to the pool one at a time, longest first, so
+each worker takes the next largest site as soon as it is idle and the short
+sites fill in around the long ones at the end. The workers read the sites'
+stats from shared memory maps (see sad_shared_data), so each task only
+carries the site's row in them.
+
+"""
+from __future__ import division
+import csv
+import os
+import time
+
+import numpy as np
+
+from sad_comparison_functions import atomic_write, fit_site, FIT_TIMEOUT
+from sad_shared_data import shared_pool, get_shared_site_stats
+
+TIMINGS_FILE = 'fit_timings.csv'
+TIMING_COLUMNS = ['S', 'N', 'max_ab', 'distinct_ab_vals', 'seconds']
+# Most recent timings kept for calibration
+MAX_TIMINGS = 20000
+# Timings needed before the cost model is calibrated
+MIN_TIMINGS = 50
+# Coefficients of log(seconds) on 1, log(S), log(N), log(max_ab) and
+# log(distinct_ab_vals) used before calibration: the likelihoods cost one
+# pmf evaluation per distinct abundance
+DEFAULT_COEFFICIENTS = np.array([-5.0, 0.0, 0.0, 0.1, 1.0])
+
+def get_cost_features(site_stats):
+    """Returns the (sites x 5) design matrix of the cost model."""
+    return np.column_stack([np.ones(len(site_stats)),
+                            np.log([stats.S for stats in site_stats]),
+                            np.log([stats.N for stats in site_stats]),
+                            np.log([stats.max_ab for stats in site_stats]),
+                            np.log([len(stats.values) for stats in site_stats])])
+
+def read_timings(timings_file):
+    """Reads past fitting timings into a (sites x TIMING_COLUMNS) array."""
+    if not os.path.exists(timings_file):
+        return np.empty((0, len(TIMING_COLUMNS)))
+    timings = np.genfromtxt(timings_file, delimiter = ',', skip_header = 1)
+    return timings.reshape(-1, len(TIMING_COLUMNS))
+
+def write_timings(timings_file, site_stats, seconds):
+    """Adds the fitting times of sites to the timings file, keeping the most recent MAX_TIMINGS."""
+    new = np.column_stack([[stats.S for stats in site_stats], [stats.N for stats in site_stats],
+                           [stats.max_ab for stats in site_stats], [len(stats.values) for stats in site_stats],
+                           seconds])
+    timings = np.vstack([read_timings(timings_file), new])[-MAX_TIMINGS:]
+    with atomic_write(timings_file) as f:
+        output = csv.writer(f)
+        output.writerow(TIMING_COLUMNS)
+        output.writerows(timings.tolist())
+
+def calibrate_cost_model(timings):
+    """Returns the least squares coefficients of the cost model for an array of timings."""
+    timings = timings[timings[:, -1] > 0]
+    if len(timings) < MIN_TIMINGS:
+        return DEFAULT_COEFFICIENTS
+    features = np.column_stack([np.ones(len(timings)), np.log(timings[:, :-1])])
+    return np.linalg.lstsq(features, np.log(timings[:, -1]), rcond = None)[0]
+
+def predict_costs(site_stats, coefficients = DEFAULT_COEFFICIENTS):
+    """Returns the predicted fitting time of each site in seconds."""
+    return np.exp(get_cost_features(site_stats).dot(coefficients))
+
+def timed_fit_site(stats, timeout = FIT_TIMEOUT):
+    """Returns fit_site(stats, timeout) and the seconds it took."""
+    start = time.time()
+    row = fit_site(stats, timeout)
+    return row, time.time() - start
+
+def timed_fit_indexed(task):
+    """Fits the site of an (index, SiteSlice, timeout) task in a shared_pool, returning (index, row, seconds)."""
+    i, site_slice, timeout = task
+    return (i, ) + timed_fit_site(get_shared_site_stats(site_slice), timeout)
+
+def schedule_fits(site_stats, processes, coefficients = DEFAULT_COEFFICIENTS, timeout = FIT_TIMEOUT):
+    """Fits the sites in a pool of processes, longest predicted first, yielding (stats, row, seconds) as they finish."""
+    order = np.argsort(-predict_costs(site_stats, coefficients), kind = 'mergesort')
+    with shared_pool(site_stats, processes) as (pool, slices):
+        # chunksize 1: each idle worker takes the next largest site
+        for i, row, seconds in pool.imap_unordered(timed_fit_indexed, [(i, slices[i], timeout) for i in order],
+                                                   chunksize = 1):
+            yield site_stats[i], row, seconds
+
+def parallel_efficiency(seconds, wall_seconds, processes):
+    """Returns the achieved and ideal parallel efficiency of fitting sites that took seconds on processes workers.
+
+    The ideal is limited by the longest site, which no schedule can split.
+
+    """
+    total = np.sum(seconds)
+    achieved = total / (wall_seconds * processes) if wall_seconds > 0 else 1.0
+    ideal = total / (processes * max(total / processes, np.max(seconds))) if total > 0 else 1.0
+    return achieved, ideal
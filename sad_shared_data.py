@@ -0,0 +1,127 @@
+"""Site stats shared with worker processes through memory-mapped files
+
+Handing SiteStats to a pool pickles every site's abundance vectors into the
+task queue and unpickles a private copy in the worker. shared_pool instead
+writes the SiteStats of all sites once to a directory of .npy files (in
+/dev/shm where it exists, so they never leave memory) that every worker maps
+read-only when it starts:
+
+ab.npy, values.npy, counts.npy - the abundance vectors and histograms of
+    distinct abundances of all sites, one site after another
+sites.npy - a row per site with its scalar stats (S, N, ...) and the
+    offsets of its vectors in the arrays above
+
+A task then only carries the site's SiteSlice, its (site, row) descriptor,
+and the worker builds the SiteStats from that row, with its vectors as views
+of the maps, so neither the abundances nor their summaries are copied or
+computed again.
+
+"""
+from __future__ import division
+from collections import namedtuple
+from contextlib import contextmanager
+import functools
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from sad_comparison_functions import SiteStats, sim_site_stats
+
+# Directory of the shared files (the system default if None)
+SHARED_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Scalar fields of SiteStats, with their types in the shared table of sites
+SCALAR_FIELDS = [('S', np.int64), ('N', np.int64), ('min_ab', np.int64), ('max_ab', np.int64),
+                 ('sum_log_ab', float)]
+SITE_DTYPE = SCALAR_FIELDS + [('ab_offset', np.int64), ('value_offset', np.int64), ('n_values', np.int64)]
+# Vector fields of SiteStats, each concatenated over the sites into its own file
+VECTOR_FIELDS = ['ab', 'values', 'counts']
+
+SiteSlice = namedtuple('SiteSlice', ['site', 'row'])
+
+# Arrays mapped by open_shared_stats in each worker process
+_shared = None
+
+def concatenate(vectors):
+    """Returns the concatenation of a list of int vectors (an empty int64 array if there are none)."""
+    return np.concatenate(vectors) if vectors else np.empty(0, dtype = np.int64)
+
+def write_shared_stats(site_stats, directory = SHARED_DIR):
+    """Writes the SiteStats of the sites to a temporary directory, returning its path and the SiteSlice of each site."""
+    table = np.zeros(len(site_stats), dtype = SITE_DTYPE)
+    for field, dtype in SCALAR_FIELDS:
+        table[field] = [getattr(stats, field) for stats in site_stats]
+    table['n_values'] = [len(stats.values) for stats in site_stats]
+    table['ab_offset'][1:] = np.cumsum(table['S'])[:-1]
+    table['value_offset'][1:] = np.cumsum(table['n_values'])[:-1]
+    path = tempfile.mkdtemp(prefix = 'sad_stats_', dir = directory)
+    try:
+        np.save(os.path.join(path, 'sites.npy'), table)
+        for field in VECTOR_FIELDS:
+            np.save(os.path.join(path, field + '.npy'),
+                    concatenate([getattr(stats, field) for stats in site_stats]))
+    except:
+        shutil.rmtree(path)
+        raise
+    return path, [SiteSlice(stats.site, i) for i, stats in enumerate(site_stats)]
+
+def open_shared_stats(path):
+    """Maps the shared stats read-only in this process (the initializer of the pool's workers).
+
+    The random state is reseeded, so that forked workers do not draw the same
+    simulated samples (see sim_shared_stats).
+
+    """
+    global _shared
+    _shared = dict((name, np.load(os.path.join(path, name + '.npy'), mmap_mode = 'r'))
+                   for name in ['sites'] + VECTOR_FIELDS)
+    np.random.seed()
+
+def get_shared_site_stats(site_slice):
+    """Returns the SiteStats of a site from its row of the shared stats, with its vectors as views of the maps."""
+    row = _shared['sites'][site_slice.row]
+    ab_offset, value_offset = row['ab_offset'], row['value_offset']
+    value_end = value_offset + row['n_values']
+    return SiteStats(site_slice.site, *[row[field] for field, dtype in SCALAR_FIELDS],
+                     values = _shared['values'][value_offset:value_end],
+                     counts = _shared['counts'][value_offset:value_end],
+                     ab = _shared['ab'][ab_offset:ab_offset + row['S']])
+
+@contextmanager
+def shared_pool(site_stats, processes, directory = SHARED_DIR):
+    """Yields a pool of processes sharing the SiteStats of site_stats, and the SiteSlice of each site.
+
+    The pool is terminated and the shared files removed when the block ends.
+
+    """
+    path, slices = write_shared_stats(site_stats, directory)
+    try:
+        pool = multiprocessing.Pool(processes, initializer = open_shared_stats, initargs = (path, ))
+        try:
+            yield pool, slices
+        finally:
+            pool.terminate()
+            pool.join()
+    finally:
+        shutil.rmtree(path)
+
+def sim_shared_stats(site_slice, dist_name, Nsim, test_stat):
+    """Returns sim_site_stats for the site of a SiteSlice in a shared_pool."""
+    return sim_site_stats(get_shared_site_stats(site_slice), dist_name, Nsim, test_stat)
+
+def sim_sites_stats(site_stats, dist_name, Nsim, test_stat, processes = None):
+    """Returns sim_site_stats for each site, simulating the sites in a pool of worker processes.
+
+    processes is the number of workers (all cores if None); with 1 the sites
+    are simulated in this process.
+
+    """
+    processes = min(processes or multiprocessing.cpu_count(), max(len(site_stats), 1))
+    if processes == 1:
+        return [sim_site_stats(stats, dist_name, Nsim, test_stat) for stats in site_stats]
+    with shared_pool(site_stats, processes) as (pool, slices):
+        sim = functools.partial(sim_shared_stats, dist_name = dist_name, Nsim = Nsim, test_stat = test_stat)
+        return pool.map(sim, slices, chunksize = len(site_stats) // (4 * processes) + 1)
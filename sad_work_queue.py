@@ -0,0 +1,271 @@
+"""SQLite work queue for fitting sites on several machines
+
+The coordinator (sad-comparisons.py --queue QUEUE_FILE) enqueues one task per
+(dataset, site), holding the site's pickled SiteStats, and reads the fitted
+rows back in site order (see imap). Workers, started locally by the
+coordinator or on any other node that sees the queue file, run
+
+python sad_work_queue.py QUEUE_FILE
+
+claim one task at a time under a lease, fit it with fit_site and post the
+fitted row. A task whose lease expires (e.g., its worker died) is issued
+again; after MAX_ATTEMPTS attempts, or a fit raising an error MAX_ATTEMPTS
+times, it is marked failed. The coordinator expires leases itself while it
+waits, so this does not depend on a live worker calling claim, and it stops
+with an error if all of the workers it started locally have died (workers on
+other nodes are not watched) and the coordinator records the site as a NaN
+row with the error status, as fit_site does for a failed model. Tasks are keyed on the site's content hash, so
+restarting the coordinator reuses the sites already fitted and only requeues
+sites whose abundances changed (or all sites, after a change of
+SOLVER_VERSION).
+
+Workers exit once the coordinator has closed the queue and no task is left
+pending or leased. The queue uses SQLite's default rollback journal, since
+write-ahead logging does not work on network filesystems; the filesystem
+must support POSIX locks.
+
+"""
+from __future__ import division
+from collections import namedtuple
+from contextlib import contextmanager
+import argparse
+import cPickle as pickle
+import functools
+import multiprocessing
+import os
+import socket
+import sqlite3 as dbapi
+import time
+import traceback
+
+import numpy as np
+
+from sad_comparison_functions import (get_site_hash, fit_site, FIT_TIMEOUT, SOLVER_VERSION, MODELS,
+                                      PARAMETER_COLUMNS, STATUS_ERROR)
+
+# Seconds a worker holds a task before it is issued to another worker
+LEASE_SECONDS = 3600
+# Attempts at a task before it is marked failed
+MAX_ATTEMPTS = 3
+# Seconds between polls of the queue by idle workers and the coordinator
+POLL_SECONDS = 2
+# Seconds to wait for another process's lock on the queue
+BUSY_TIMEOUT = 600
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS Tasks
+            (dataset TEXT,
+             site TEXT,
+             hash TEXT,
+             stats BLOB,
+             status TEXT, -- pending, leased, done or failed
+             worker TEXT,
+             lease_expires REAL,
+             attempts INTEGER,
+             error TEXT,
+             PRIMARY KEY (dataset, site));
+            CREATE INDEX IF NOT EXISTS TaskStatus ON Tasks (status);
+            CREATE TABLE IF NOT EXISTS Results
+            (result_id INTEGER PRIMARY KEY,
+             dataset TEXT,
+             site TEXT,
+             row BLOB);
+            CREATE INDEX IF NOT EXISTS ResultSite ON Results (dataset, site);
+            CREATE TABLE IF NOT EXISTS QueueState
+            (key TEXT PRIMARY KEY,
+             value INTEGER);"""
+
+Task = namedtuple('Task', ['dataset', 'site', 'hash', 'stats'])
+
+def connect(queue_file):
+    """Opens the queue, creating its tables if needed."""
+    con = dbapi.connect(queue_file, timeout = BUSY_TIMEOUT, isolation_level = None)
+    # Switch con data type to string
+    con.text_factory = str
+    con.executescript(SCHEMA)
+    return con
+
+@contextmanager
+def transaction(con):
+    """Runs a block in a transaction that holds the queue's write lock from the start."""
+    con.execute('BEGIN IMMEDIATE')
+    try:
+        yield
+    except:
+        con.execute('ROLLBACK')
+        raise
+    con.execute('COMMIT')
+
+def dump(obj):
+    """Pickles an object into a blob."""
+    return dbapi.Binary(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+def load(blob):
+    """Unpickles a blob."""
+    return pickle.loads(str(blob))
+
+def set_closed(con, closed):
+    """Opens (closed = False) or closes the queue; workers exit once it is closed and drained."""
+    with transaction(con):
+        con.execute("INSERT OR REPLACE INTO QueueState (key, value) VALUES ('closed', ?)", (int(closed), ))
+
+def is_drained(con):
+    """Returns True if the queue is closed and no task is pending or leased."""
+    closed = con.execute("SELECT value FROM QueueState WHERE key = 'closed'").fetchone()
+    if not (closed and closed[0]):
+        return False
+    return not con.execute("SELECT 1 FROM Tasks WHERE status IN ('pending', 'leased') LIMIT 1").fetchone()
+
+def get_task_hash(stats):
+    """Returns the key of a site's task: the content hash of its abundances and the SOLVER_VERSION."""
+    return '%s:%s' % (get_site_hash(stats), SOLVER_VERSION)
+
+def enqueue(con, dataset, site_stats):
+    """Adds a task for each site of a dataset, returning the number of sites queued.
+
+    Sites already in the queue with the same task hash are left as they
+    are, except failed ones, which are tried again.
+
+    """
+    hashes = [get_task_hash(stats) for stats in site_stats]
+    with transaction(con):
+        existing = dict(((site, site_hash), status) for site, site_hash, status in
+                        con.execute('SELECT site, hash, status FROM Tasks WHERE dataset = ?', (dataset, )))
+        new = [(stats, site_hash) for stats, site_hash in zip(site_stats, hashes)
+               if existing.get((stats.site, site_hash), 'failed') == 'failed']
+        con.executemany('DELETE FROM Results WHERE dataset = ? AND site = ?',
+                        [(dataset, stats.site) for stats, site_hash in new])
+        con.executemany("""INSERT OR REPLACE INTO Tasks (dataset, site, hash, stats, status, attempts)
+                           VALUES (?, ?, ?, ?, 'pending', 0)""",
+                        [(dataset, stats.site, site_hash, dump(stats)) for stats, site_hash in new])
+    return len(new)
+
+def expire_leases(con, now):
+    """Marks the tasks whose lease has expired after MAX_ATTEMPTS attempts as failed (within a transaction)."""
+    con.execute("""UPDATE Tasks SET status = 'failed', error = 'lease expired'
+                   WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?""", (now, MAX_ATTEMPTS))
+
+def claim(con, worker, lease_seconds = LEASE_SECONDS):
+    """Leases the next pending (or expired) task to worker, returning the Task or None if there is none."""
+    now = time.time()
+    with transaction(con):
+        expire_leases(con, now)
+        task = con.execute("""SELECT dataset, site, hash, stats FROM Tasks
+                              WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?)
+                              ORDER BY rowid LIMIT 1""", (now, )).fetchone()
+        if task is None:
+            return None
+        con.execute("""UPDATE Tasks SET status = 'leased', worker = ?, lease_expires = ?, attempts = attempts + 1
+                       WHERE dataset = ? AND site = ?""", (worker, now + lease_seconds, task[0], task[1]))
+    return Task(task[0], task[1], task[2], load(task[3]))
+
+def complete(con, task, row):
+    """Posts the fitted row of a task, unless it has been completed (or requeued with new data) meanwhile."""
+    with transaction(con):
+        updated = con.execute("""UPDATE Tasks SET status = 'done', stats = NULL
+                                 WHERE dataset = ? AND site = ? AND hash = ? AND status != 'done'""",
+                              (task.dataset, task.site, task.hash)).rowcount
+        if updated:
+            con.execute('INSERT INTO Results (dataset, site, row) VALUES (?, ?, ?)',
+                        (task.dataset, task.site, dump(row)))
+
+def fail(con, task, worker, error):
+    """Records a failed attempt at a task, which is issued again until it has been tried MAX_ATTEMPTS times."""
+    with transaction(con):
+        con.execute("""UPDATE Tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                        error = ?
+                       WHERE dataset = ? AND site = ? AND hash = ? AND status = 'leased' AND worker = ?""",
+                    (MAX_ATTEMPTS, error, task.dataset, task.site, task.hash, worker))
+
+def get_failed_row(stats):
+    """Returns the fitted row of a site whose task failed: NaN fits, each with the error status (see FIT_COLUMNS)."""
+    return ([stats.site, stats.S, stats.N] + [np.nan] * (len(MODELS) + len(PARAMETER_COLUMNS)) +
+            [STATUS_ERROR] * len(MODELS))
+
+def iter_results(con, dataset, site_stats, poll_seconds = POLL_SECONDS, workers = None):
+    """Yields the fitted rows of the given sites of a dataset in order, waiting for the workers as needed.
+
+    A site whose task has failed is yielded as a failed row (see
+    get_failed_row), so one site cannot stop the run. workers are the local
+    worker processes (see start_workers); if they have all died a
+    RuntimeError is raised rather than waiting for them.
+
+    """
+    wanted = set(stats.site for stats in site_stats)
+    results = {}
+    last_id = 0
+    for stats in site_stats:
+        site = stats.site
+        while site not in results:
+            rows = con.execute('SELECT result_id, site, row FROM Results WHERE dataset = ? AND result_id > ?',
+                               (dataset, last_id)).fetchall()
+            for result_id, result_site, row in rows:
+                last_id = max(last_id, result_id)
+                if result_site in wanted:
+                    results[result_site] = load(row)
+            if site in results:
+                break
+            with transaction(con):
+                expire_leases(con, time.time())
+            failed = con.execute("SELECT error FROM Tasks WHERE dataset = ? AND site = ? AND status = 'failed'",
+                                 (dataset, site)).fetchone()
+            if failed:
+                print("Warning: %s, Site %s failed:\n%s" % (dataset, site, failed[0]))
+                results[site] = get_failed_row(stats)
+                break
+            if workers and not any(worker.is_alive() for worker in workers):
+                raise RuntimeError("%s, Site %s: all local workers have died" % (dataset, site))
+            time.sleep(poll_seconds)
+        yield results.pop(site)
+
+def imap(con, dataset, site_stats, poll_seconds = POLL_SECONDS, workers = None):
+    """Queues the sites of a dataset and yields their fitted rows in site_stats order (see iter_results)."""
+    queued = enqueue(con, dataset, site_stats)
+    print("%s: queued %s of %s sites" % (dataset, queued, len(site_stats)))
+    return iter_results(con, dataset, site_stats, poll_seconds, workers)
+
+def run_worker(queue_file, fit = fit_site, lease_seconds = LEASE_SECONDS, poll_seconds = POLL_SECONDS):
+    """Fits the tasks of a queue until it is closed and drained, returning the number of tasks fitted."""
+    worker = '%s:%s' % (socket.gethostname(), os.getpid())
+    con = connect(queue_file)
+    fitted = 0
+    try:
+        while True:
+            task = claim(con, worker, lease_seconds)
+            if task is None:
+                if is_drained(con):
+                    return fitted
+                time.sleep(poll_seconds)
+                continue
+            try:
+                row = fit(task.stats)
+            except Exception:
+                fail(con, task, worker, traceback.format_exc())
+                continue
+            complete(con, task, row)
+            fitted += 1
+    finally:
+        con.close()
+
+def start_workers(queue_file, processes, lease_seconds = LEASE_SECONDS, fit_timeout = FIT_TIMEOUT):
+    """Starts processes local worker processes on a queue and returns them."""
+    fit = functools.partial(fit_site, timeout = fit_timeout)
+    workers = [multiprocessing.Process(target = run_worker, args = (queue_file, fit, lease_seconds))
+               for i in range(processes)]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    return workers
+
+def main():
+    parser = argparse.ArgumentParser(description='Fit the sites of a sad-comparisons.py work queue.')
+    parser.add_argument('queue_file')
+    parser.add_argument('--lease', type=int, default=LEASE_SECONDS,
+                        help='seconds a task is held before it is issued again')
+    parser.add_argument('--fit-timeout', type=float, default=FIT_TIMEOUT,
+                        help='seconds allowed for each model fit of a site (0 for no limit)')
+    args = parser.parse_args()
+    fit = functools.partial(fit_site, timeout=args.fit_timeout)
+    print("Fitted %s sites" % run_worker(args.queue_file, fit, lease_seconds=args.lease))
+
+if __name__ == '__main__':
+    main()